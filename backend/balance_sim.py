@@ -0,0 +1,243 @@
+"""
+Monte Carlo balance simulator for Whac-A-Deficiency.
+
+Replays the spawn/whack rules of the frontend game (App.js) for many rounds
+at once with NumPy: every array holds one value per simulated round and the
+game clock advances one spawn at a time. Rounds are split into chunks that
+run in parallel on a process pool.
+
+Usage:
+    python balance_sim.py --rounds 1000000
+    python balance_sim.py --modes survival --skills casual --malus-scale 0.5 1 2 --json
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+from game_data import COMBO_RESET_MS, COMBO_WINDOW_MS, DEFICIENCY_CATALOG, DIFFICULTIES, HOLES, ROUND_MS
+
+SURVIVAL_LEVEL_MS = 15000
+MAX_LEVEL = ROUND_MS // SURVIVAL_LEVEL_MS + 1
+
+MODES = list(DIFFICULTIES) + ["survival"]
+
+
+class PlayerSkill(NamedTuple):
+    reaction_ms: float      # median reaction time
+    reaction_sigma: float   # log-normal spread of the reaction time
+    accuracy: float         # chance of hitting a target item in time
+    malus_avoidance: float  # chance of leaving a malus alone
+
+
+SKILLS = {
+    "novice": PlayerSkill(900, 0.35, 0.70, 0.60),
+    "casual": PlayerSkill(650, 0.30, 0.85, 0.80),
+    "expert": PlayerSkill(420, 0.25, 0.95, 0.95),
+}
+
+
+def spawn_schedule(mode: str) -> List[tuple]:
+    """(time_ms, level) of every spawn tick in a 60 second round."""
+    ticks = []
+    t = 0
+    if mode == "survival":
+        while True:
+            level = 1 + t // SURVIVAL_LEVEL_MS
+            game_speed = max(300, 1000 - 100 * (level - 1))
+            t += max(300, game_speed - level * 50)
+            if t >= ROUND_MS:
+                return ticks
+            ticks.append((t, 1 + t // SURVIVAL_LEVEL_MS))
+    spawn_ms = DIFFICULTIES[mode][0]
+    while t + spawn_ms < ROUND_MS:
+        t += spawn_ms
+        ticks.append((t, 1))
+    return ticks
+
+
+def simulate_chunk(mode: str, skill: PlayerSkill, rounds: int, seed, malus_scale: float = 1.0) -> Dict:
+    """Simulate `rounds` rounds; returns final scores and per-level malus counters."""
+    rng = np.random.default_rng(seed)
+    points = np.array([d["points"] for d in DEFICIENCY_CATALOG], dtype=np.float64)
+    is_malus = np.array([d["type"] == "malus" for d in DEFICIENCY_CATALOG])
+    base_rates = np.array([d["appearance_rate"] for d in DEFICIENCY_CATALOG])
+    base_rates = np.where(is_malus, base_rates * malus_scale, base_rates)
+    is_short = np.array([d["type"] in ("bonus", "malus") for d in DEFICIENCY_CATALOG])
+    is_ananas = np.array([d["name"] == "Ananas" for d in DEFICIENCY_CATALOG])
+    survival = mode == "survival"
+
+    score = np.zeros(rounds)
+    combo = np.zeros(rounds, dtype=np.int32)
+    last_whack = np.full(rounds, -1e9)
+    end_time = np.full(rounds, float(ROUND_MS))
+    hole_free_at = np.zeros((rounds, HOLES))
+    row = np.arange(rounds)
+
+    spawns_per_level = np.zeros(MAX_LEVEL + 1, dtype=np.int64)
+    malus_per_level = np.zeros(MAX_LEVEL + 1, dtype=np.int64)
+    malus_hits_per_level = np.zeros(MAX_LEVEL + 1, dtype=np.int64)
+
+    for t, level in spawn_schedule(mode):
+        alive = end_time > t
+        if not alive.any():
+            break
+        free = hole_free_at <= t
+        spawned = alive & free.any(axis=1)
+
+        # Free holes are interchangeable (their free-since time no longer
+        # matters), so taking the first one is equivalent to a random pick
+        hole = free.argmax(axis=1)
+
+        rates = base_rates
+        if survival and level > 3:
+            rates = np.where(is_malus, rates * (1 + level * 0.1), rates)
+        cumulative = np.cumsum(rates)
+        kind = np.searchsorted(cumulative, rng.random(rounds, dtype=np.float32) * cumulative[-1], side="right")
+        kind = np.minimum(kind, len(rates) - 1)
+        malus = is_malus[kind]
+
+        if survival:
+            duration = np.full(rounds, float(max(800, 2000 - level * 100)))
+        else:
+            base = DIFFICULTIES[mode][1]
+            duration = np.where(is_short[kind], base * 0.7, float(base))
+
+        reaction = skill.reaction_ms * np.exp(skill.reaction_sigma * rng.standard_normal(rounds, dtype=np.float32))
+        decision = rng.random(rounds, dtype=np.float32)
+        wants = np.where(malus, decision >= skill.malus_avoidance, decision < skill.accuracy)
+        hit = spawned & wants & (reaction < duration)
+        whack_at = t + reaction
+
+        # The combo decays after 2s without a whack; multiplier uses the combo before this whack
+        combo = np.where(whack_at - last_whack >= COMBO_RESET_MS, 0, combo)
+        multiplier = np.select([combo >= 10, combo >= 5, combo >= 3], [3.0, 2.0, 1.5], 1.0)
+        gained = np.where(malus, points[kind], np.round(points[kind] * multiplier))
+        score = np.where(hit, np.maximum(0, score + gained), score)
+        next_combo = np.where(malus, 0, np.where(whack_at - last_whack < COMBO_WINDOW_MS, combo + 1, 1))
+        combo = np.where(hit, next_combo, combo)
+        last_whack = np.where(hit, whack_at, last_whack)
+
+        held_until = t + np.where(hit, reaction, duration)
+        hole_free_at[row, hole] = np.where(spawned, held_until, hole_free_at[row, hole])
+
+        if survival:
+            malus_hit = hit & malus
+            ananas = is_ananas[kind]
+            shortened = np.where(
+                ananas,
+                np.maximum(whack_at + 5000, end_time - 5000),
+                np.maximum(whack_at + 1000, end_time - 2000),
+            )
+            end_time = np.where(malus_hit, np.minimum(end_time, shortened), end_time)
+
+        spawns_per_level[level] += int(spawned.sum())
+        malus_per_level[level] += int((spawned & malus).sum())
+        malus_hits_per_level[level] += int((hit & malus).sum())
+
+    return {
+        "scores": score.astype(np.int32),
+        "spawns_per_level": spawns_per_level,
+        "malus_per_level": malus_per_level,
+        "malus_hits_per_level": malus_hits_per_level,
+    }
+
+
+def _run_chunk(args):
+    return args[0], simulate_chunk(*args[1:])
+
+
+def summarize(rounds: int, chunks: List[Dict]) -> Dict:
+    scores = np.concatenate([c["scores"] for c in chunks])
+    spawns = sum(c["spawns_per_level"] for c in chunks)
+    malus = sum(c["malus_per_level"] for c in chunks)
+    malus_hits = sum(c["malus_hits_per_level"] for c in chunks)
+    p10, p50, p90, p99 = np.percentile(scores, [10, 50, 90, 99])
+    counts, edges = np.histogram(scores, bins=20)
+    return {
+        "rounds": rounds,
+        "score_mean": round(float(scores.mean()), 2),
+        "score_std": round(float(scores.std()), 2),
+        "score_p10": float(p10),
+        "score_p50": float(p50),
+        "score_p90": float(p90),
+        "score_p99": float(p99),
+        "histogram": {"counts": counts.tolist(), "edges": [round(float(e), 1) for e in edges]},
+        "levels": {
+            int(level): {
+                "malus_share": round(float(malus[level] / spawns[level]), 4),
+                "malus_per_round": round(float(malus[level] / rounds), 3),
+                "malus_hits_per_round": round(float(malus_hits[level] / rounds), 3),
+            }
+            for level in range(1, MAX_LEVEL + 1)
+            if spawns[level]
+        },
+    }
+
+
+def run_sweep(
+    modes: List[str],
+    skills: List[str],
+    malus_scales: List[float],
+    rounds: int,
+    chunk_size: int = 50000,
+    workers: int = None,
+    seed: int = 0,
+) -> Dict:
+    """Simulate every (mode, skill, malus scale) combination on a process pool."""
+    configs = list(itertools.product(modes, skills, malus_scales))
+    tasks = []
+    seeds = np.random.SeedSequence(seed).spawn(len(configs) * (-(-rounds // chunk_size)))
+    for mode, skill, scale in configs:
+        for start in range(0, rounds, chunk_size):
+            tasks.append(((mode, skill, scale), mode, SKILLS[skill], min(chunk_size, rounds - start), seeds[len(tasks)], scale))
+
+    chunks: Dict[tuple, List[Dict]] = {config: [] for config in configs}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for config, result in pool.map(_run_chunk, tasks):
+            chunks[config].append(result)
+
+    return {
+        f"{mode}/{skill}/malus_x{scale:g}": summarize(rounds, chunks[(mode, skill, scale)])
+        for mode, skill, scale in configs
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whac-A-Deficiency balance simulator")
+    parser.add_argument("--rounds", type=int, default=200000, help="rounds per configuration")
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--skills", nargs="+", default=list(SKILLS), choices=list(SKILLS))
+    parser.add_argument("--malus-scale", nargs="+", type=float, default=[1.0],
+                        help="multipliers applied to every malus appearance_rate")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the full results as JSON")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = run_sweep(args.modes, args.skills, args.malus_scale, args.rounds,
+                        args.chunk_size, args.workers, args.seed)
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'configuration':<32} {'mean':>8} {'std':>8} {'p10':>7} {'p50':>7} {'p90':>7}  malus share by level")
+    for name, summary in results.items():
+        levels = " ".join(f"L{level}:{stats['malus_share']:.3f}" for level, stats in summary["levels"].items())
+        print(f"{name:<32} {summary['score_mean']:>8.1f} {summary['score_std']:>8.1f} "
+              f"{summary['score_p10']:>7.0f} {summary['score_p50']:>7.0f} {summary['score_p90']:>7.0f}  {levels}")
+    total = args.rounds * len(results)
+    print(f"\n{total:,} rounds in {elapsed:.1f}s ({total / elapsed:,.0f} rounds/s)")
+
+
+if __name__ == "__main__":
+    main()
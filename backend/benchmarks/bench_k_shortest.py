@@ -0,0 +1,89 @@
+"""
+Benchmark for the k-shortest-routes engine on a metro-sized network.
+
+Builds a seeded synthetic network of 324 stations (an 18x18 grid of
+connections with random travel times plus a few express shortcuts), loads it
+into a ChallengePool and times uncached `k_shortest_paths` queries between
+random station pairs. Exits with status 1 if the p95 latency exceeds the
+budget.
+
+Usage (from backend/):
+    python -m benchmarks.bench_k_shortest --k 3 --queries 500 --budget-ms 5
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from metro_challenges import ChallengePool
+from metro_routing import k_shortest_paths
+
+
+def synthetic_network(size: int = 18, shortcuts: int = 40, seed: int = 0):
+    rng = random.Random(seed)
+    stations = {
+        f"s{row}_{col}": {"name": f"Station {row}-{col}", "connections": []}
+        for row in range(size)
+        for col in range(size)
+    }
+
+    def connect(a, b, minutes):
+        stations[a]["connections"].append((b, minutes))
+        stations[b]["connections"].append((a, minutes))
+
+    for row in range(size):
+        for col in range(size):
+            if col + 1 < size:
+                connect(f"s{row}_{col}", f"s{row}_{col + 1}", rng.randint(1, 4))
+            if row + 1 < size:
+                connect(f"s{row}_{col}", f"s{row + 1}_{col}", rng.randint(1, 4))
+    ids = list(stations)
+    for _ in range(shortcuts):
+        a, b = rng.sample(ids, 2)
+        if all(neighbor != b for neighbor, _ in stations[a]["connections"]):
+            connect(a, b, rng.randint(4, 10))
+    return stations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="k-shortest routes benchmark")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--size", type=int, default=18, help="grid side; size*size stations")
+    parser.add_argument("--budget-ms", type=float, default=5.0, help="p95 latency budget")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stations = synthetic_network(args.size, seed=args.seed)
+    pool = ChallengePool(seed=args.seed)
+    started = time.perf_counter()
+    pool.refresh(stations)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    adjacency = pool.adjacency
+    rng = random.Random(args.seed)
+    ids = list(stations)
+    timings = []
+    for _ in range(args.queries):
+        origin, destination = rng.sample(ids, 2)
+        started = time.perf_counter()
+        routes = k_shortest_paths(
+            adjacency, origin, destination, args.k,
+            lambda station: pool.distance(station, destination),
+        )
+        timings.append((time.perf_counter() - started) * 1000)
+        assert len(routes) == args.k and routes[0][0] == pool.distance(origin, destination)
+
+    timings.sort()
+    p95 = timings[int(0.95 * (len(timings) - 1))]
+    print(f"stations: {len(stations)}, pool build: {build_ms:.0f} ms, k={args.k}, queries: {args.queries}")
+    print(f"mean {statistics.mean(timings):.3f} ms  p50 {timings[len(timings) // 2]:.3f} ms  "
+          f"p95 {p95:.3f} ms  max {timings[-1]:.3f} ms  (budget p95 <= {args.budget_ms} ms)")
+    if p95 > args.budget_ms:
+        print("FAIL: p95 latency over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
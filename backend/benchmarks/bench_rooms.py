@@ -0,0 +1,190 @@
+"""
+Load test for multiplayer rooms.
+
+In-process mode (default) runs many rooms of bot players on one event loop,
+with no network: bots decode every tick frame and whack spawned items after
+a random reaction time, so hit conflicts happen as in a real game. It
+reports how late ticks fire (the room schedulers' share of event-loop
+lag), frames and bytes sent, and CPU use. It exits with status 1 if the
+p99 tick lateness exceeds the budget, one tick by default: beyond that,
+clients see the board stutter.
+
+With --url, the same bots connect over real WebSockets to a running server
+(needs the `websockets` package and a JWT per bot from --tokens-file, one
+per line; each room uses --players consecutive tokens).
+
+Usage (from backend/):
+    python -m benchmarks.bench_rooms --rooms 300 --players 4 --round-ms 10000
+    python -m benchmarks.bench_rooms --url http://127.0.0.1:8001 --tokens-file tokens.txt --rooms 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import urllib.request
+
+import rooms
+from db_monitor import LatencyStats
+from rooms import INPUT_WHACK, SPAWN, TICK_HEADER, WHACK, RoomManager
+
+
+def spawned_items(data: bytes):
+    """Item ids spawned by a tick frame."""
+    spawns = TICK_HEADER.unpack_from(data)[3]
+    return [SPAWN.unpack_from(data, TICK_HEADER.size + i * SPAWN.size)[0] for i in range(spawns)]
+
+
+class Bot:
+    def __init__(self, rng: random.Random, whack):
+        self.rng = rng
+        self.whack = whack
+        self.frames = 0
+        self.bytes = 0
+
+    def on_frame(self, data: bytes):
+        self.frames += 1
+        self.bytes += len(data)
+        loop = asyncio.get_running_loop()
+        for item_id in spawned_items(data):
+            if self.rng.random() < 0.8:
+                loop.call_later(self.rng.lognormvariate(-0.5, 0.3), self.whack, item_id)
+
+
+class FakeSocket:
+    """Stands in for a WebSocket: frames go straight to the bot."""
+
+    def __init__(self):
+        self.bot = None
+        self.closed = asyncio.Event()
+
+    async def send_bytes(self, data: bytes):
+        self.bot.on_frame(data)
+
+    async def send_text(self, text: str):
+        pass
+
+    async def close(self):
+        self.closed.set()
+
+
+async def run_in_process(args):
+    manager = RoomManager(max_rooms=args.rooms)
+    manager.tick_lateness = LatencyStats(window=10 ** 7)
+    rng = random.Random(args.seed)
+    bots, tasks = [], []
+
+    async def start_later(room, host, delay):
+        await asyncio.sleep(delay)
+        room.start(host)
+        await room.task
+
+    for r in range(args.rooms):
+        room = manager.create(args.difficulty, seed=rng.random())
+        players = []
+        for p in range(args.players):
+            socket = FakeSocket()
+            player = room.join(f"user-{r}-{p}", f"bot{p}", socket)
+            socket.bot = Bot(random.Random(rng.random()), lambda item_id, room=room, player=player: room.whack(player, item_id))
+            bots.append(socket.bot)
+            players.append(player)
+        # Real rooms start whenever their host clicks; spread the tick phases
+        tasks.append(start_later(room, players[0], rng.random() * rooms.TICK_MS / 1000 if args.stagger else 0))
+
+    cpu, wall = time.process_time(), time.perf_counter()
+    await asyncio.gather(*tasks)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    manager.close_all()
+    return manager.snapshot(), sum(bot.frames for bot in bots), sum(bot.bytes for bot in bots), cpu, wall
+
+
+async def run_over_network(args):
+    import websockets
+
+    tokens = [line.strip() for line in open(args.tokens_file) if line.strip()]
+    if len(tokens) < args.players:
+        sys.exit("Need at least --players tokens")
+    ws_base = args.url.replace("http", "ws", 1).rstrip("/")
+    rng = random.Random(args.seed)
+    lateness = []
+
+    async def play(room_id, token, host):
+        async with websockets.connect(f"{ws_base}/api/rooms/{room_id}/ws?token={token}") as ws:
+            bot = Bot(random.Random(rng.random()), lambda item_id: asyncio.ensure_future(ws.send(WHACK.pack(INPUT_WHACK, item_id))))
+            if host:
+                await asyncio.sleep(1)  # let the others join
+                await ws.send(json.dumps({"type": "start"}))
+            start = None
+            async for message in ws:
+                if isinstance(message, bytes):
+                    _, tick, _, _, _, _ = TICK_HEADER.unpack_from(message)
+                    now = time.perf_counter()
+                    start = start if start is not None else now - tick * rooms.TICK_MS / 1000
+                    lateness.append((now - start - tick * rooms.TICK_MS / 1000) * 1000)
+                    bot.on_frame(message)
+                elif json.loads(message)["type"] == "results":
+                    return bot
+
+    def create_room(token):
+        request = urllib.request.Request(
+            f"{args.url.rstrip('/')}/api/rooms", data=json.dumps({"difficulty": args.difficulty}).encode(),
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"}, method="POST",
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())["id"]
+
+    games = []
+    for r in range(args.rooms):
+        room_tokens = [tokens[(r * args.players + p) % len(tokens)] for p in range(args.players)]
+        room_id = create_room(room_tokens[0])
+        games.extend(play(room_id, token, p == 0) for p, token in enumerate(room_tokens))
+    cpu, wall = time.process_time(), time.perf_counter()
+    bots = await asyncio.gather(*games)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    lateness.sort()
+    snapshot = {
+        "rooms": args.rooms,
+        "tick_lateness": {
+            "p50_ms": round(lateness[len(lateness) // 2], 3) if lateness else 0.0,
+            "p99_ms": round(lateness[int(0.99 * (len(lateness) - 1))], 3) if lateness else 0.0,
+            "max_ms": round(lateness[-1], 3) if lateness else 0.0,
+        },
+    }
+    return snapshot, sum(b.frames for b in bots), sum(b.bytes for b in bots), cpu, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multiplayer rooms load test")
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--difficulty", default="hard", choices=sorted(rooms.DIFFICULTIES))
+    parser.add_argument("--round-ms", type=int, default=10000, help="shorter rounds for quicker runs (in-process only)")
+    parser.add_argument("--budget-ms", type=float, default=rooms.TICK_MS, help="p99 tick lateness budget")
+    parser.add_argument("--no-stagger", dest="stagger", action="store_false",
+                        help="start every room on the same tick phase (worst case)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="load a running server instead of an in-process RoomManager")
+    parser.add_argument("--tokens-file", help="JWTs for the bots, one per line (with --url)")
+    args = parser.parse_args()
+
+    if args.url:
+        result = asyncio.run(run_over_network(args))
+    else:
+        rooms.ROUND_MS = args.round_ms
+        result = asyncio.run(run_in_process(args))
+    snapshot, frames, received, cpu, wall = result
+
+    lateness = snapshot["tick_lateness"]
+    print(f"{args.rooms} rooms x {args.players} players, {args.difficulty}, {wall:.1f}s wall")
+    print(f"frames received {frames:,} ({frames / wall:,.0f}/s), {received:,} bytes ({received / wall / 1024:,.1f} KiB/s), "
+          f"{received / max(1, frames):.1f} B/frame")
+    print(f"tick lateness p50 {lateness['p50_ms']:.2f} ms, p99 {lateness['p99_ms']:.2f} ms, max {lateness['max_ms']:.2f} ms")
+    print(f"CPU {cpu:.1f}s ({100 * cpu / wall:.0f}% of one core)")
+    if lateness["p99_ms"] > args.budget_ms:
+        print(f"FAIL: p99 tick lateness above {args.budget_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Performance regression gate.
+
+Times a fixed set of metrics and compares them with the recorded baseline
+in benchmarks/baselines/baseline.json:
+
+    micro.*     dijkstra, calculate_score, the get_deficiencies handler,
+                password hashing/verification and JWT decoding
+    endpoint.*  API routes called in process through FastAPI's TestClient,
+                against an in-memory Mongo stand-in (mongomock-motor, see
+                benchmarks/requirements.txt; skipped when not installed).
+                Cached routes are timed both as cache hits and, as
+                *_uncached, with their cache entry dropped before each call
+
+Every metric is the best per-call time over several repeats, which is the
+least noisy statistic on a shared machine. A pure-Python calibration loop
+runs between the repeats, and metrics are compared as a multiple of its
+time. That cancels out the machine's speed, both between machines and
+when a shared host slows down partway through a run.
+`check` exits with status 1 when a metric is slower than its baseline by
+more than the tolerance in two measurements in a row: a slowdown that does
+not reproduce is noise from the host, not a regression. A baseline metric
+that could not be measured (e.g. endpoint.* without mongomock-motor) fails
+the check too; use --only micro to check the other group on purpose.
+
+Usage (from backend/):
+    python -m benchmarks.perf_gate check
+    python -m benchmarks.perf_gate check --tolerance 0.3 --only micro
+    python -m benchmarks.perf_gate record --runs 3 --note "after caching highscores"
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+BASELINE_FORMAT = 1
+BASELINE_PATH = Path(__file__).parent / "baselines" / "baseline.json"
+
+# Imported by server.py at module level; the Motor client connects lazily
+os.environ.setdefault("MONGO_URL", "mongodb://127.0.0.1:27017")
+os.environ.setdefault("DB_NAME", "perf_gate")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+# The models use pydantic's v1-style .dict() like the rest of the backend
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+
+def per_call_seconds(func: Callable, number: int) -> float:
+    # Like timeit: no collector pauses inside a timed run
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        return (time.perf_counter() - started) / number
+    finally:
+        gc.enable()
+
+
+def calibration_workload():
+    sum(i * i for i in range(20000))
+
+
+def best_time_us(func: Callable, number: int, repeat: int = 7) -> Tuple[float, float]:
+    """
+    Best per-call time in microseconds over `repeat` runs of `number` calls,
+    and that time relative to the best calibration time measured between
+    those runs.
+    """
+    best = calibration = float("inf")
+    for _ in range(repeat):
+        calibration = min(calibration, per_call_seconds(calibration_workload, 10))
+        best = min(best, per_call_seconds(func, number))
+    return best * 1e6, best / calibration
+
+
+def micro_metrics(server) -> Dict[str, Tuple[float, float]]:
+    from benchmarks.bench_k_shortest import synthetic_network
+
+    large = synthetic_network(18, seed=0)
+    large_ids = list(large)
+    loop = asyncio.new_event_loop()
+    password_hash = server.get_password_hash("benchmark-password")
+    token = server.create_access_token({"sub": "benchmark"})
+    handler = server.get_deficiencies.__wrapped__
+    try:
+        return {
+            "micro.dijkstra_metro": best_time_us(lambda: server.dijkstra(server.STATIONS, "station1", "station4"), 2000),
+            "micro.dijkstra_324_stations": best_time_us(
+                lambda: server.dijkstra(large, large_ids[0], large_ids[-1]), 5),
+            "micro.calculate_score": best_time_us(lambda: server.calculate_score(27, 21, 2), 20000),
+            "micro.get_deficiencies": best_time_us(lambda: loop.run_until_complete(handler()), 500),
+            "micro.password_hash": best_time_us(lambda: server.get_password_hash("benchmark-password"), 2, repeat=5),
+            "micro.password_verify": best_time_us(
+                lambda: server.verify_password("benchmark-password", password_hash), 2, repeat=5),
+            "micro.jwt_decode": best_time_us(lambda: server.username_from_token(token), 5000),
+        }
+    finally:
+        loop.close()
+
+
+def seed_database(server, client, users: int = 200, scores: int = 5000):
+    """Users and scores for the endpoint benchmarks, written straight to the stand-in."""
+    from score_store import encode_score
+
+    rng = random.Random(0)
+    hashed = server.get_password_hash("benchmark-password")
+    user_docs = [
+        server.User(username=f"player{i}", email=f"player{i}@example.com", hashed_password=hashed,
+                    company="Bench").dict()
+        for i in range(users)
+    ]
+    # Every player gets scores in both games
+    score_docs = [
+        encode_score(server.GameScore(
+            user_id=user_docs[i % users]["id"],
+            game_type=("whac_a_deficiency", "paris_metro")[(i // users) % 2],
+            score=rng.randrange(0, 1500),
+            time_taken=60.0,
+        ).dict())
+        for i in range(scores)
+    ]
+    client.portal.call(server.db.users.insert_many, user_docs)
+    client.portal.call(server.db.scores.insert_many, score_docs)
+    return {"Authorization": f"Bearer {server.create_access_token({'sub': 'player0'})}"}
+
+
+def endpoint_stand_in_missing() -> bool:
+    try:
+        import fastapi.testclient  # noqa: F401 (needs httpx)
+        import mongomock_motor  # noqa: F401
+    except ImportError as e:
+        print(f"Cannot run endpoint benchmarks ({e}); pip install -r benchmarks/requirements.txt")
+        return True
+    return False
+
+
+def endpoint_metrics(server) -> Dict[str, Tuple[float, float]]:
+    if endpoint_stand_in_missing():
+        return {}
+    from fastapi.testclient import TestClient
+    from mongomock_motor import AsyncMongoMockClient
+
+    server.db = AsyncMongoMockClient()[os.environ["DB_NAME"]]
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    # The handlers print per request; that cost is measured, the output is not shown
+    with TestClient(server.app) as client, open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        headers = seed_database(server, client)
+        # The rank index loaded at startup, before the seeding
+        client.portal.call(server.load_rank_index)
+        route = ["station1", "station2", "station3", "station4"]
+
+        def get(path, **kwargs):
+            response = client.get(path, **kwargs)
+            assert response.status_code == 200, (path, response.status_code, response.text)
+
+        def post(path, **kwargs):
+            response = client.post(path, **kwargs)
+            assert response.status_code == 200, (path, response.status_code, response.text)
+
+        def uncached(namespace, path):
+            # Every call recomputes: the query and the handler code are what gets timed
+            def call():
+                server.response_cache.invalidate(namespace)
+                get(path)
+            return call
+
+        def create_score():
+            post("/api/scores", json={"game_type": "paris_metro", "score": 50, "time_taken": 20}, headers=headers)
+
+        def create_batch():
+            scores = [{"idempotency_key": uuid.uuid4().hex, "game_type": "whac_a_deficiency", "score": 300}
+                      for _ in range(10)]
+            post("/api/scores/batch", json={"scores": scores}, headers=headers)
+
+        return {
+            "endpoint.root": best_time_us(lambda: get("/api/"), 200),
+            "endpoint.deficiencies": best_time_us(lambda: get("/api/whac-a-deficiency/deficiencies"), 200),
+            "endpoint.stations": best_time_us(lambda: get("/api/paris-metro/stations"), 200),
+            "endpoint.highscores": best_time_us(lambda: get("/api/scores/highscores/paris_metro"), 200),
+            "endpoint.deficiencies_uncached": best_time_us(
+                uncached("deficiencies", "/api/whac-a-deficiency/deficiencies"), 200),
+            "endpoint.stations_uncached": best_time_us(uncached("stations", "/api/paris-metro/stations"), 200),
+            "endpoint.highscores_uncached": best_time_us(
+                uncached("highscores", "/api/scores/highscores/paris_metro"), 5),
+            "endpoint.check_route": best_time_us(lambda: post("/api/paris-metro/check-route", json=route), 200),
+            "endpoint.rank": best_time_us(lambda: get("/api/scores/rank/paris_metro", headers=headers), 100),
+            "endpoint.user_scores": best_time_us(lambda: get("/api/scores/user", headers=headers), 5),
+            "endpoint.create_score": best_time_us(create_score, 50),
+            "endpoint.create_batch_10": best_time_us(create_batch, 20),
+        }
+
+
+def measure(only: str = None) -> Dict:
+    import server
+
+    started = time.perf_counter()
+    metrics = {}
+    if only in (None, "micro"):
+        metrics.update(micro_metrics(server))
+    if only in (None, "endpoint"):
+        metrics.update(endpoint_metrics(server))
+    print(f"Measured {len(metrics)} metrics in {time.perf_counter() - started:.1f}s")
+    # "relative" is what gets compared: the time in units of the calibration
+    # loop run next to it, which cancels out the machine's speed at that moment
+    return {name: {"us": round(us, 3), "relative": round(relative, 6)} for name, (us, relative) in metrics.items()}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def record(args):
+    if args.only is None and endpoint_stand_in_missing():
+        sys.exit("Cannot record endpoint metrics without mongomock-motor: "
+                 "pip install -r benchmarks/requirements.txt, or record with --only micro")
+    # Some metrics differ by a third from one process to the next (memory
+    # layout), so a baseline from one lucky run would make every later check
+    # look slower: keep the slowest of several runs
+    runs = [measure(args.only) for _ in range(args.runs)]
+    metrics = {name: max((run[name] for run in runs), key=lambda metric: metric["relative"]) for name in runs[0]}
+    if args.only and args.baseline.exists():
+        # Partial runs only replace the metrics they measured
+        metrics = {**json.loads(args.baseline.read_text())["metrics"], **metrics}
+    baseline = {
+        "format": BASELINE_FORMAT,
+        "recorded_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "note": args.note,
+        "metrics": metrics,
+    }
+    args.baseline.parent.mkdir(parents=True, exist_ok=True)
+    args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+    print(f"Recorded {len(baseline['metrics'])} metrics to {args.baseline}")
+
+
+def check(args) -> int:
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run `python -m benchmarks.perf_gate record` first")
+        return 1
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("format") != BASELINE_FORMAT:
+        print(f"Baseline format {baseline.get('format')} is not {BASELINE_FORMAT}; record a new one")
+        return 1
+    current = measure(args.only)
+    slower = [name for name in current if name in baseline["metrics"]
+              and current[name]["relative"] > baseline["metrics"][name]["relative"] * (1 + args.tolerance)]
+    if slower:
+        print(f"Measuring again to confirm: {', '.join(sorted(slower))}")
+        for group in sorted({name.split(".")[0] for name in slower}):
+            for name, again in measure(group).items():
+                if again["relative"] < current[name]["relative"]:
+                    current[name] = again
+
+    regressions = missing = 0
+    print(f"Baseline {baseline['commit']} ({baseline['recorded_at']}, {baseline['machine']})")
+    print(f"{'metric':<30} {'baseline us':>12} {'current us':>12} {'change':>8}")
+    for name in sorted(set(baseline["metrics"]) | set(current)):
+        if name not in current:
+            if args.only is None or name.startswith(args.only + "."):
+                print(f"{name:<30} {'':>12} {'':>12} {'':>8}  NOT MEASURED")
+                missing += 1
+            continue
+        now = current[name]
+        if name not in baseline["metrics"]:
+            print(f"{name:<30} {'':>12} {now['us']:>12.1f} {'':>8}  new")
+            continue
+        before = baseline["metrics"][name]
+        # Compared relative to the calibration loop; raw times are shown for reference
+        change = now["relative"] / before["relative"] - 1
+        status = ""
+        if change > args.tolerance:
+            status = "REGRESSED"
+            regressions += 1
+        elif change < -args.tolerance:
+            status = "faster"
+        print(f"{name:<30} {before['us']:>12.1f} {now['us']:>12.1f} {change:>+8.1%}  {status}")
+
+    if missing:
+        print(f"FAIL: {missing} baseline metric(s) not measured; an unchecked metric is not a passing one")
+    if regressions:
+        print(f"FAIL: {regressions} metric(s) more than {args.tolerance:.0%} slower than the baseline")
+    if missing or regressions:
+        return 1
+    print(f"OK: no metric more than {args.tolerance:.0%} slower than the baseline")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Performance regression gate")
+    parser.add_argument("command", choices=["check", "record"])
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown, 0.3 = 30%%")
+    parser.add_argument("--only", choices=["micro", "endpoint"], help="measure one group of metrics")
+    parser.add_argument("--runs", type=int, default=3, help="runs whose slowest result is recorded")
+    parser.add_argument("--note", default="", help="stored with a recorded baseline")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args)
+    else:
+        sys.exit(check(args))
+
+
+if __name__ == "__main__":
+    main()
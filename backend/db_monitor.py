@@ -0,0 +1,149 @@
+"""
+MongoDB connection pool and command instrumentation.
+
+`PoolMonitor` is registered on the Motor client through pymongo's event
+listeners. It tracks how long callers wait to check a connection out of the
+pool, how many connections are in use, and per-command latency, so pool
+sizing and query time budgets can be tuned from real traffic.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+from pymongo import monitoring
+
+
+class LatencyStats:
+    """Count/total/max plus a bounded window of recent samples for percentiles."""
+
+    __slots__ = ("count", "total", "max", "recent")
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.recent.append(value)
+
+    def snapshot(self) -> Dict[str, float]:
+        ordered = sorted(self.recent)
+
+        def percentile(p):
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3)
+
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": percentile(0.50),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(self.max, 3),
+        }
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener, monitoring.CommandListener):
+    """
+    Listener for both pool and command events.
+
+    Motor runs each operation on an executor thread and the pool checkout
+    happens synchronously on that thread, so the checkout start time is keyed
+    by thread id.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checkout_started: Dict[int, float] = {}
+        self.checkout_wait = LatencyStats()
+        self.commands: Dict[str, LatencyStats] = {}
+        self.open_connections = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.checkout_failures = 0
+        self.command_failures = 0
+        self.pool_clears = 0
+
+    # Pool events
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        self._checkout_started[threading.get_ident()] = _now_ms()
+
+    def connection_check_out_failed(self, event):
+        self._checkout_started.pop(threading.get_ident(), None)
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        started = self._checkout_started.pop(threading.get_ident(), None)
+        with self._lock:
+            if started is not None:
+                self.checkout_wait.add(_now_ms() - started)
+            self.in_use += 1
+            if self.in_use > self.max_in_use:
+                self.max_in_use = self.in_use
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    # Command events
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        with self._lock:
+            stats = self.commands.get(event.command_name)
+            if stats is None:
+                stats = self.commands[event.command_name] = LatencyStats(window=256)
+            stats.add(event.duration_micros / 1000)
+
+    def failed(self, event):
+        with self._lock:
+            self.command_failures += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "open_connections": self.open_connections,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "checkout_wait": self.checkout_wait.snapshot(),
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+                "command_failures": self.command_failures,
+                "commands": {name: stats.snapshot() for name, stats in self.commands.items()},
+            }
+
+
+def _now_ms() -> float:
+    return time.monotonic() * 1000
@@ -0,0 +1,204 @@
+"""
+Static game content shared by the API and the offline tools.
+"""
+import json
+
+# Liste des déficiences nutritionnelles (à taper)
+DEFICIENCY_CATALOG = [
+    {
+        "name": "Calcium",
+        "points": 10,
+        "appearance_rate": 0.2,
+        "description": "Essential for bone health",
+        "icon": "🦴",
+        "type": "deficiency"
+    },
+    {
+        "name": "Vitamin D",
+        "points": 15,
+        "appearance_rate": 0.15,
+        "description": "Helps with calcium absorption",
+        "icon": "☁️",
+        "type": "deficiency"
+    },
+    {
+        "name": "Iron",
+        "points": 20,
+        "appearance_rate": 0.15,
+        "description": "Crucial for blood health",
+        "icon": "🔴",
+        "type": "deficiency"
+    },
+    {
+        "name": "Magnesium",
+        "points": 25,
+        "appearance_rate": 0.1,
+        "description": "Important for muscle function",
+        "icon": "⚡",
+        "type": "deficiency"
+    },
+    {
+        "name": "Vitamin B12",
+        "points": 30,
+        "appearance_rate": 0.1,
+        "description": "Critical for nerve function",
+        "icon": "🧠",
+        "type": "deficiency"
+    },
+    {
+        "name": "Zinc",
+        "points": 35,
+        "appearance_rate": 0.05,
+        "description": "Supports immune system",
+        "icon": "🛡️",
+        "type": "deficiency"
+    },
+    # Bonus (à taper)
+    {
+        "name": "Bolognaise",
+        "points": 30,
+        "appearance_rate": 0.07,
+        "description": "Délicieuse sauce pour pâtes",
+        "icon": "🍅",
+        "type": "bonus"
+    },
+    {
+        "name": "Pâtes",
+        "points": 25,
+        "appearance_rate": 0.08,
+        "description": "Base parfaite pour vos spaghetti",
+        "icon": "🍝",
+        "type": "bonus"
+    },
+    {
+        "name": "Parmesan",
+        "points": 20,
+        "appearance_rate": 0.05,
+        "description": "Fromage qui complète parfaitement les pâtes",
+        "icon": "🧀",
+        "type": "bonus"
+    },
+    # Malus (à éviter)
+    {
+        "name": "Mayonnaise",
+        "points": -20,
+        "appearance_rate": 0.03,
+        "description": "Ne va pas du tout avec les spaghetti!",
+        "icon": "🥚",
+        "type": "malus"
+    },
+    {
+        "name": "Concombre",
+        "points": -15,
+        "appearance_rate": 0.03,
+        "description": "Pas dans mes spaghetti!",
+        "icon": "🥒",
+        "type": "malus"
+    },
+    {
+        "name": "Avocat",
+        "points": -25,
+        "appearance_rate": 0.02,
+        "description": "Garde ça pour ton guacamole!",
+        "icon": "🥑",
+        "type": "malus"
+    },
+    {
+        "name": "Ananas",
+        "points": -30,
+        "appearance_rate": 0.02,
+        "description": "L'hérésie ultime!",
+        "icon": "🍍",
+        "type": "malus"
+    }
+]
+
+# Whac-A-Deficiency round rules, as played by the frontend (App.js)
+HOLES = 9
+ROUND_MS = 60000
+COMBO_WINDOW_MS = 1500
+COMBO_RESET_MS = 2000
+
+# Standard mode: (spawn interval, base display duration) per difficulty
+DIFFICULTIES = {
+    "easy": (1500, 2500),
+    "normal": (1000, 2000),
+    "hard": (700, 1500),
+}
+
+# Paris Metro network
+# For now, we'll use a simplified version of the Paris metro data
+STATIONS = {
+    "station1": {"name": "Bastille", "connections": [("station2", 2), ("station5", 4)]},
+    "station2": {"name": "Nation", "connections": [("station1", 2), ("station3", 3)]},
+    "station3": {"name": "Denfert-Rochereau", "connections": [("station2", 3), ("station4", 2)]},
+    "station4": {"name": "Montparnasse", "connections": [("station3", 2), ("station6", 3)]},
+    "station5": {"name": "République", "connections": [("station1", 4), ("station6", 5)]},
+    "station6": {"name": "Châtelet", "connections": [("station4", 3), ("station5", 5)]}
+}
+
+# Metro lines over the connections above, in travel order (trains run both ways).
+# Times are minutes after midnight; service past midnight goes beyond 24 * 60.
+METRO_LINES = {
+    "1": {"stations": ["station2", "station1"], "headway": 3, "first": 5 * 60 + 30, "last": 24 * 60 + 40},
+    "4": {"stations": ["station6", "station4"], "headway": 4, "first": 5 * 60 + 30, "last": 24 * 60 + 40},
+    "5": {"stations": ["station1", "station5"], "headway": 5, "first": 5 * 60 + 30, "last": 24 * 60 + 40},
+    "6": {"stations": ["station2", "station3", "station4"], "headway": 5, "first": 5 * 60 + 30, "last": 24 * 60 + 40},
+    "11": {"stations": ["station5", "station6"], "headway": 6, "first": 5 * 60 + 30, "last": 24 * 60 + 40},
+}
+
+# Minimum time to change lines at a station
+TRANSFER_MINUTES = 4
+
+
+def load_metro_network(path=None):
+    """
+    (stations, lines, transfer minutes) of the Paris Metro network, read from
+    a JSON file shaped like the constants above when `path` is given:
+
+        {"stations": {id: {"name": ..., "connections": [[to, minutes], ...]}},
+         "lines": {name: {"stations": [...], "headway": ..., "first": ..., "last": ...}},
+         "transfer_minutes": 4}
+    """
+    if not path:
+        return STATIONS, METRO_LINES, TRANSFER_MINUTES
+    with open(path, encoding="utf-8") as f:
+        network = json.load(f)
+    stations = {
+        station_id: {"name": station["name"], "connections": [(to, time) for to, time in station["connections"]]}
+        for station_id, station in network["stations"].items()
+    }
+    lines = network["lines"]
+    transfer_minutes = network.get("transfer_minutes", TRANSFER_MINUTES)
+    validate_metro_network(stations, lines, transfer_minutes)
+    return stations, lines, transfer_minutes
+
+
+def validate_metro_network(stations, lines, transfer_minutes):
+    """Raise ValueError unless the routing and the timetable can be built from the network."""
+    def is_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    travel = set()
+    for station_id, station in stations.items():
+        for to, minutes in station["connections"]:
+            if to not in stations:
+                raise ValueError(f"Connection from {station_id} to unknown station {to}")
+            if not is_number(minutes) or minutes <= 0:
+                raise ValueError(f"Connection from {station_id} to {to} must take more than 0 minutes")
+            travel.add((station_id, to))
+    for name, line in lines.items():
+        stops = line["stations"]
+        for station_id in stops:
+            if station_id not in stations:
+                raise ValueError(f"Line {name} serves unknown station {station_id}")
+        # Trains run both ways, so each hop needs a connection in both directions
+        for a, b in zip(stops, stops[1:]):
+            if (a, b) not in travel or (b, a) not in travel:
+                raise ValueError(f"Line {name} runs between {a} and {b}, which are not connected both ways")
+        if not isinstance(line["headway"], int) or line["headway"] <= 0:
+            raise ValueError(f"Line {name} needs a headway of at least 1 minute")
+        if not isinstance(line["first"], int) or not isinstance(line["last"], int) or line["first"] > line["last"]:
+            raise ValueError(f"Line {name} needs whole-minute first and last departures, first <= last")
+    if not is_number(transfer_minutes) or transfer_minutes < 0:
+        raise ValueError("transfer_minutes must not be negative")
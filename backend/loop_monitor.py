@@ -0,0 +1,140 @@
+"""
+Event-loop lag monitoring and on-demand stack sampling.
+
+bcrypt hashing and route search run synchronously inside async handlers, so
+one slow request stalls every other request on the worker. `LoopLagMonitor`
+measures how late the loop wakes up and, when a stall passes the threshold,
+records which requests were running at the time. `sample_stacks` profiles
+the event-loop thread from a side thread and returns collapsed stacks that
+flamegraph.pl / speedscope can read directly.
+"""
+import asyncio
+import itertools
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, history: int = 100):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.stalls: deque = deque(maxlen=history)
+        self._active: Dict[int, tuple] = {}
+        self._finished: deque = deque(maxlen=256)
+        self._ids = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    def current_lag(self) -> float:
+        return self.lag
+
+    def request_started(self, method: str, path: str) -> int:
+        request_id = next(self._ids)
+        self._active[request_id] = (method, path, time.monotonic())
+        return request_id
+
+    def request_finished(self, request_id: int):
+        method, path, started = self._active.pop(request_id)
+        self._finished.append((method, path, started, time.monotonic()))
+
+    def _requests_during(self, since: float) -> List[Dict[str, Any]]:
+        """Requests that were running at any point after `since`, longest first."""
+        now = time.monotonic()
+        requests = [
+            {"method": method, "path": path, "duration_ms": round((now - started) * 1000, 1), "finished": False}
+            for method, path, started in self._active.values()
+        ]
+        requests += [
+            {"method": method, "path": path, "duration_ms": round((ended - started) * 1000, 1), "finished": True}
+            for method, path, started, ended in self._finished
+            if ended >= since
+        ]
+        requests.sort(key=lambda r: r["duration_ms"], reverse=True)
+        return requests[:10]
+
+    async def _run(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, time.monotonic() - start - self.interval)
+            if self.lag > self.max_lag:
+                self.max_lag = self.lag
+            if self.lag > self.threshold:
+                self.stalls.append({
+                    "at": time.time(),
+                    "lag_ms": round(self.lag * 1000, 1),
+                    "requests": self._requests_during(start),
+                })
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "lag_ms": round(self.lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "threshold_ms": round(self.threshold * 1000, 2),
+            "stalls": list(self.stalls)[-20:],
+        }
+
+
+class RequestTrackingMiddleware:
+    """ASGI middleware telling the LoopLagMonitor which requests are in progress."""
+
+    def __init__(self, app, monitor: LoopLagMonitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = self.monitor.request_started(scope["method"], scope["path"])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.request_finished(request_id)
+
+
+_profile_lock = threading.Lock()
+
+
+def sample_stacks(thread_id: int, duration: float, interval: float = 0.005) -> str:
+    """
+    Sample the stack of `thread_id` every `interval` seconds for `duration`
+    seconds and return it in collapsed format ("frame;frame;frame count").
+    Must be called from another thread; only one profile runs at a time.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        stacks: Counter = Counter()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                break
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stacks[";".join(reversed(frames))] += 1
+            time.sleep(interval)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    finally:
+        _profile_lock.release()
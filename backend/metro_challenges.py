@@ -0,0 +1,222 @@
+"""
+Precomputed challenge pool for the Paris Metro game.
+
+Every station pair is graded once, from one shortest-path tree per origin,
+and bucketed into difficulty tiers by the number of hops and line changes
+on its optimal route. Challenges are then served round-robin from a shuffled ring buffer
+per tier and answers are graded by looking up the precomputed optimum.
+
+When the network changes, `refresh()` only recomputes the trees of origins
+whose shortest paths can actually be affected by the changed connections.
+"""
+import random
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from metro_routing import Adjacency, adjacency_from_stations, k_shortest_paths, path_to, shortest_path_tree
+from metro_timetable import count_transfers, edge_lines
+
+# Tier name -> (max hops, max transfers) on the optimal route, easiest first;
+# a pair goes to the first tier it fits, None means unbounded
+DEFAULT_TIERS = {
+    "easy": (2, 0),
+    "normal": (3, 1),
+    "hard": (None, None),
+}
+
+
+class Optimum:
+    __slots__ = ("time", "route")
+
+    def __init__(self, time: float, route: List[str]):
+        self.time = time
+        self.route = route
+
+    @property
+    def hops(self) -> int:
+        return len(self.route) - 1
+
+
+class ChallengePool:
+    def __init__(self, tiers: Optional[Dict[str, Tuple[Optional[int], Optional[int]]]] = None, seed=None,
+                 max_alternatives: int = 4096):
+        self.tiers = tiers or DEFAULT_TIERS
+        self.max_alternatives = max_alternatives
+        self._random = random.Random(seed)
+        self._adjacency: Adjacency = {}
+        self._edge_lines: Dict[tuple, set] = {}
+        self._trees: Dict[str, tuple] = {}
+        self._rings: Dict[str, List[Tuple[str, str]]] = {}
+        self._cursors: Dict[str, int] = {}
+        # Least recently used first; bounded by max_alternatives
+        self._alternatives: "OrderedDict[Tuple[str, str, int], List[Tuple[float, List[str]]]]" = OrderedDict()
+        self.version = 0
+
+    @property
+    def adjacency(self) -> Adjacency:
+        return self._adjacency
+
+    def refresh(self, stations, lines=None) -> int:
+        """
+        Bring the pool in line with `stations` (and the `lines` serving them,
+        used to count transfers). Returns the number of origins whose
+        shortest-path tree had to be recomputed.
+
+        Everything is computed aside and swapped in at the end, so the pool
+        is unchanged if the new network makes any step fail.
+        """
+        adjacency = adjacency_from_stations(stations)
+        served = edge_lines(lines) if lines else {}
+        if adjacency == self._adjacency:
+            if served != self._edge_lines:
+                self._set_rings(self._build_rings(self._trees, served))
+                self._edge_lines = served
+                self.version += 1
+            return 0
+
+        changed = _changed_edges(self._adjacency, adjacency)
+        trees = {source: tree for source, tree in self._trees.items() if source in adjacency}
+
+        recompute = [source for source in adjacency if source not in trees]
+        for source, (distances, previous) in trees.items():
+            if _tree_affected(distances, previous, changed):
+                recompute.append(source)
+
+        for source in recompute:
+            trees[source] = shortest_path_tree(adjacency, source)
+        rings = self._build_rings(trees, served)
+
+        self._trees = trees
+        self._adjacency = adjacency
+        self._edge_lines = served
+        self._alternatives.clear()
+        self._set_rings(rings)
+        self.version += 1
+        return len(recompute)
+
+    def _build_rings(self, trees, served) -> Dict[str, List[Tuple[str, str]]]:
+        rings: Dict[str, List[Tuple[str, str]]] = {tier: [] for tier in self.tiers}
+        for source, (distances, previous) in trees.items():
+            # Parents are always closer than their children, so walking the
+            # tree in distance order extends each parent's counts in one pass.
+            # state = (hops, transfers, lines that can ride the current run)
+            state = {source: (0, 0, None)}
+            for target in sorted(distances, key=distances.get):
+                if target == source:
+                    continue
+                parent = previous[target]
+                hops, transfers, riding = state[parent]
+                lines = served.get((parent, target), set())
+                if riding is None:
+                    riding = lines
+                elif riding & lines:
+                    riding = riding & lines
+                else:
+                    transfers += 1
+                    riding = lines
+                state[target] = (hops + 1, transfers, riding)
+                tier = self.tier_for(hops + 1, transfers)
+                if tier is not None:
+                    rings[tier].append((source, target))
+        for ring in rings.values():
+            self._random.shuffle(ring)
+        return rings
+
+    def _set_rings(self, rings):
+        self._rings = rings
+        self._cursors = {tier: 0 for tier in rings}
+
+    def tier_for(self, hops: int, transfers: int = 0) -> Optional[str]:
+        for tier, (max_hops, max_transfers) in self.tiers.items():
+            if (max_hops is None or hops <= max_hops) and (max_transfers is None or transfers <= max_transfers):
+                return tier
+        return None
+
+    def transfers(self, route: List[str]) -> int:
+        return count_transfers(route, self._edge_lines)
+
+    def next_challenge(self, tier: str) -> Optional[Tuple[str, str]]:
+        """
+        Next (origin, destination) pair of `tier`, falling back to the nearest
+        non-empty tier on small networks. Reshuffles each time a ring wraps.
+        """
+        names = list(self.tiers)
+        index = names.index(tier)
+        for name in sorted(names, key=lambda other: abs(names.index(other) - index)):
+            ring = self._rings.get(name)
+            if ring:
+                cursor = self._cursors[name]
+                if cursor == len(ring):
+                    self._random.shuffle(ring)
+                    cursor = 0
+                self._cursors[name] = cursor + 1
+                return ring[cursor]
+        return None
+
+    def optimum(self, origin: str, destination: str) -> Optional[Optimum]:
+        tree = self._trees.get(origin)
+        if tree is None or destination not in tree[0]:
+            return None
+        distances, previous = tree
+        return Optimum(distances[destination], path_to(previous, destination))
+
+    def distance(self, origin: str, destination: str) -> float:
+        tree = self._trees.get(origin)
+        if tree is None:
+            return float('infinity')
+        return tree[0].get(destination, float('infinity'))
+
+    def alternatives(self, origin: str, destination: str, k: int) -> List[Tuple[float, List[str]]]:
+        """
+        The `k` fastest routes between two stations, cached until the next
+        refresh (the `max_alternatives` most recently used pairs).
+        """
+        key = (origin, destination, k)
+        routes = self._alternatives.get(key)
+        if routes is not None:
+            self._alternatives.move_to_end(key)
+        else:
+            if origin not in self._adjacency or destination not in self._adjacency:
+                return []
+            routes = k_shortest_paths(
+                self._adjacency, origin, destination, k,
+                lambda station: self.distance(station, destination),
+            )
+            self._alternatives[key] = routes
+            while len(self._alternatives) > self.max_alternatives:
+                self._alternatives.popitem(last=False)
+        return routes
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "version": self.version,
+            "cached_alternatives": len(self._alternatives),
+            **{tier: len(ring) for tier, ring in self._rings.items()},
+        }
+
+
+def _changed_edges(old: Adjacency, new: Adjacency) -> List[tuple]:
+    """(u, v, old_time, new_time) for every added, removed or re-timed connection."""
+    changed = []
+    for u in old.keys() | new.keys():
+        old_edges = old.get(u, {})
+        new_edges = new.get(u, {})
+        for v in old_edges.keys() | new_edges.keys():
+            before, after = old_edges.get(v), new_edges.get(v)
+            if before != after:
+                changed.append((u, v, before, after))
+    return changed
+
+
+def _tree_affected(distances, previous, changed) -> bool:
+    """
+    A tree stays optimal unless a changed edge was part of it and got slower
+    (or vanished), or a new/faster edge now shortens the path to some station.
+    """
+    infinity = float('infinity')
+    for u, v, before, after in changed:
+        if before is not None and previous.get(v) == u and (after is None or after > before):
+            return True
+        if after is not None and u in distances and distances[u] + after < distances.get(v, infinity):
+            return True
+    return False
@@ -0,0 +1,119 @@
+"""
+Graph helpers for the Paris Metro game.
+
+The station table (`game_data.STATIONS`) stores connections as
+`(station_id, minutes)` tuples; these helpers work on a plain adjacency
+mapping `{station: {neighbor: minutes}}` built from it.
+"""
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+Adjacency = Dict[str, Dict[str, float]]
+
+
+def adjacency_from_stations(stations) -> Adjacency:
+    return {
+        station_id: {neighbor: time for neighbor, time in data["connections"]}
+        for station_id, data in stations.items()
+    }
+
+
+def shortest_path_tree(adjacency: Adjacency, source: str) -> Tuple[Dict[str, float], Dict[str, Optional[str]]]:
+    """
+    Heap-based Dijkstra from `source` to every reachable station.
+    Returns (distances, previous); unreachable stations are absent.
+    """
+    distances = {source: 0}
+    previous: Dict[str, Optional[str]] = {source: None}
+    heap = [(0, source)]
+    while heap:
+        distance, current = heapq.heappop(heap)
+        if distance > distances[current]:
+            continue
+        for neighbor, time in adjacency[current].items():
+            candidate = distance + time
+            if candidate < distances.get(neighbor, float('infinity')):
+                distances[neighbor] = candidate
+                previous[neighbor] = current
+                heapq.heappush(heap, (candidate, neighbor))
+    return distances, previous
+
+
+def path_to(previous: Dict[str, Optional[str]], target: str) -> List[str]:
+    path = []
+    current = target
+    while current is not None:
+        path.append(current)
+        current = previous[current]
+    path.reverse()
+    return path
+
+
+def _astar(adjacency, source, target, heuristic, banned_nodes, banned_edges):
+    """
+    A* from `source` to `target` avoiding `banned_nodes` and `banned_edges`.
+    `heuristic(station)` must never overestimate the remaining time.
+    Returns (time, path) or None.
+    """
+    infinity = float('infinity')
+    best = {source: 0}
+    previous = {source: None}
+    heap = [(heuristic(source), 0, source)]
+    while heap:
+        _, distance, current = heapq.heappop(heap)
+        if current == target:
+            return distance, path_to(previous, target)
+        if distance > best[current]:
+            continue
+        for neighbor, time in adjacency[current].items():
+            if neighbor in banned_nodes or (current, neighbor) in banned_edges:
+                continue
+            candidate = distance + time
+            if candidate < best.get(neighbor, infinity):
+                estimate = heuristic(neighbor)
+                if estimate == infinity:
+                    continue
+                best[neighbor] = candidate
+                previous[neighbor] = current
+                heapq.heappush(heap, (candidate + estimate, candidate, neighbor))
+    return None
+
+
+def k_shortest_paths(adjacency: Adjacency, source: str, target: str, k: int, distance_to_target) -> List[Tuple[float, List[str]]]:
+    """
+    Yen's algorithm: the `k` fastest loopless routes, fastest first.
+
+    `distance_to_target(station)` gives the shortest time from a station to
+    `target` in the full network (taken from the cached shortest-path trees).
+    Removing stations and connections can only make routes longer, so it is
+    an exact-where-possible A* heuristic for every spur search.
+    """
+    first = _astar(adjacency, source, target, distance_to_target, set(), set())
+    if first is None:
+        return []
+    found = [first]
+    candidates = []
+    seen = {tuple(first[1])}
+
+    while len(found) < k:
+        _, last_path = found[-1]
+        root_time = 0
+        for i in range(len(last_path) - 1):
+            spur = last_path[i]
+            root = last_path[:i + 1]
+            banned_edges = {
+                (path[i], path[i + 1]) for _, path in found if len(path) > i + 1 and path[:i + 1] == root
+            }
+            spur_result = _astar(adjacency, spur, target, distance_to_target, set(root[:-1]), banned_edges)
+            if spur_result is not None:
+                spur_time, spur_path = spur_result
+                path = root[:-1] + spur_path
+                if tuple(path) not in seen:
+                    seen.add(tuple(path))
+                    heapq.heappush(candidates, (root_time + spur_time, len(path), path))
+            root_time += adjacency[spur][last_path[i + 1]]
+        if not candidates:
+            break
+        time, _, path = heapq.heappop(candidates)
+        found.append((time, path))
+    return found
@@ -0,0 +1,163 @@
+"""
+Line-aware, time-dependent routing for the Paris Metro game.
+
+`Timetable` expands every line into individual trips (both directions, from
+first to last departure at the line headway) and stores the resulting
+elementary connections - one train between two consecutive stations - in
+flat `array` columns sorted by departure time. Journeys are answered with
+the Connection Scan Algorithm: a single forward pass over the connections
+departing after the requested time, where staying on the same trip is free
+and changing trains costs the transfer time.
+"""
+import bisect
+from array import array
+from typing import Dict, List, Optional
+
+INFINITY = 2 ** 31 - 1
+DAY_MINUTES = 24 * 60
+
+
+def edge_lines(lines) -> Dict[tuple, set]:
+    """{(station, next_station): {line, ...}} for both travel directions."""
+    served = {}
+    for line, data in lines.items():
+        stops = data["stations"]
+        for a, b in zip(stops, stops[1:]):
+            served.setdefault((a, b), set()).add(line)
+            served.setdefault((b, a), set()).add(line)
+    return served
+
+
+def count_transfers(path: List[str], served: Dict[tuple, set]) -> int:
+    """
+    Fewest line changes needed to ride `path`. Staying on a line for as long
+    as possible is optimal, so the lines still able to cover the current run
+    are intersected edge by edge and a transfer is counted when none is left.
+    """
+    transfers = 0
+    riding = None
+    for a, b in zip(path, path[1:]):
+        lines = served.get((a, b), set())
+        if riding is None:
+            riding = set(lines)
+        elif riding & lines:
+            riding &= lines
+        else:
+            transfers += 1
+            riding = set(lines)
+    return transfers
+
+
+class Timetable:
+    def __init__(self, stations, lines, transfer_minutes: int):
+        self.transfer_minutes = transfer_minutes
+        self.station_ids = list(stations)
+        self.index = {station_id: i for i, station_id in enumerate(self.station_ids)}
+        self.line_names: List[str] = []
+        travel = {
+            (station_id, neighbor): minutes
+            for station_id, data in stations.items()
+            for neighbor, minutes in data["connections"]
+        }
+
+        rows = []
+        trip_lines = array("h")
+        for line, data in lines.items():
+            line_index = len(self.line_names)
+            self.line_names.append(line)
+            for stops in (data["stations"], data["stations"][::-1]):
+                legs = [travel[(a, b)] for a, b in zip(stops, stops[1:])]
+                for start in range(data["first"], data["last"] + 1, data["headway"]):
+                    trip = len(trip_lines)
+                    trip_lines.append(line_index)
+                    t = start
+                    for (a, b), minutes in zip(zip(stops, stops[1:]), legs):
+                        rows.append((t, t + minutes, self.index[a], self.index[b], trip))
+                        t += minutes
+        rows.sort()
+
+        # Column storage: five machine-int arrays instead of a list of tuples
+        self.departures = array("i", (row[0] for row in rows))
+        self.arrivals = array("i", (row[1] for row in rows))
+        self.from_stops = array("h", (row[2] for row in rows))
+        self.to_stops = array("h", (row[3] for row in rows))
+        self.trips = array("i", (row[4] for row in rows))
+        self.trip_lines = trip_lines
+
+    def __len__(self):
+        return len(self.departures)
+
+    def journey(self, origin: str, destination: str, departure: int) -> Optional[Dict]:
+        """
+        Earliest-arrival journey leaving `origin` at or after `departure`
+        (minutes after midnight), or None if the destination is unreachable.
+        """
+        if origin == destination:
+            return None
+        best = self._scan(origin, destination, departure)
+        # Trains after midnight belong to the previous service day and are
+        # stored past 24 * 60, so 00:10 can also be minute 1450 of that day
+        if len(self) and departure + DAY_MINUTES <= self.departures[-1]:
+            late = self._scan(origin, destination, departure + DAY_MINUTES)
+            if late is not None and (best is None or late["duration"] < best["duration"]):
+                best = late
+        return best
+
+    def _scan(self, origin: str, destination: str, departure: int) -> Optional[Dict]:
+        source = self.index[origin]
+        target = self.index[destination]
+        departures, arrivals = self.departures, self.arrivals
+        from_stops, to_stops, trips = self.from_stops, self.to_stops, self.trips
+        transfer = self.transfer_minutes
+
+        earliest = [INFINITY] * len(self.station_ids)
+        earliest[source] = departure
+        boarded_at: Dict[int, int] = {}
+        reached_by: Dict[int, tuple] = {}
+
+        for c in range(bisect.bisect_left(departures, departure), len(departures)):
+            leaves = departures[c]
+            if leaves >= earliest[target]:
+                break
+            trip = trips[c]
+            stop = from_stops[c]
+            if trip not in boarded_at:
+                ready = earliest[stop] + (0 if stop == source else transfer)
+                if earliest[stop] == INFINITY or ready > leaves:
+                    continue
+                boarded_at[trip] = c
+            arrives = arrivals[c]
+            if arrives < earliest[to_stops[c]]:
+                earliest[to_stops[c]] = arrives
+                reached_by[to_stops[c]] = (boarded_at[trip], c)
+
+        if earliest[target] == INFINITY:
+            return None
+
+        legs = []
+        stop = target
+        while stop != source:
+            first, last = reached_by[stop]
+            trip = trips[first]
+            route = [self.station_ids[from_stops[first]]]
+            for c in range(first, last + 1):
+                if trips[c] == trip and self.station_ids[from_stops[c]] == route[-1]:
+                    route.append(self.station_ids[to_stops[c]])
+            legs.append({
+                "line": self.line_names[self.trip_lines[trip]],
+                "from": route[0],
+                "to": route[-1],
+                "departure": departures[first],
+                "arrival": arrivals[last],
+                "stations": route,
+            })
+            stop = from_stops[first]
+        legs.reverse()
+
+        return {
+            "departure": legs[0]["departure"],
+            "arrival": earliest[target],
+            "duration": earliest[target] - departure,
+            "transfers": len(legs) - 1,
+            "legs": legs,
+        }
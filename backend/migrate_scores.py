@@ -0,0 +1,136 @@
+"""
+Rewrite legacy score documents into the compact layout of score_store.py.
+
+The migration runs online next to the API: it moves documents in small
+batches (insert the compact copy, then delete the legacy one) and sleeps
+between batches. It is resumable and idempotent - a legacy document is
+simply one that still has a string `id` field, and re-inserting a compact
+copy that already exists is ignored - so it can be stopped and restarted
+at any point.
+
+Legacy documents are walked in order of their ObjectId `_id`, resuming
+after the last one migrated (kept in db.migrations), so every batch is a
+short range scan of the `_id` index and never passes over the compact
+documents already written.
+
+Storage and index sizes of the collection are printed before and after.
+
+Usage (from backend/):
+    python migrate_scores.py --batch-size 500 --pause 0.2
+    python migrate_scores.py --stats-only
+    python migrate_scores.py --rescan
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from score_store import encode_score
+
+DUPLICATE_KEY = 11000
+JOURNAL_ID = "compact_scores"
+# Legacy documents have a Mongo-generated ObjectId `_id`, compact ones a binary UUID
+LEGACY_FILTER = {"_id": {"$type": "objectId"}, "id": {"$exists": True}}
+
+
+def collection_stats(db):
+    stats = db.command("collStats", "scores")
+    return {
+        "count": stats.get("count", 0),
+        "avg_obj_size": stats.get("avgObjSize", 0),
+        "size": stats.get("size", 0),
+        "storage_size": stats.get("storageSize", 0),
+        "total_index_size": stats.get("totalIndexSize", 0),
+        "index_sizes": stats.get("indexSizes", {}),
+    }
+
+
+def print_stats(label, stats):
+    print(f"{label}: {stats['count']} documents, avg {stats['avg_obj_size']} B, "
+          f"data {stats['size']} B, storage {stats['storage_size']} B, indexes {stats['total_index_size']} B")
+    for name, size in stats["index_sizes"].items():
+        print(f"    index {name}: {size} B")
+
+
+def legacy_after(position):
+    """Legacy documents after the ObjectId `position`, as a keyset range on `_id`."""
+    return {"_id": {"$gt": position, "$type": "objectId"}, "id": {"$exists": True}}
+
+
+def migrate(db, batch_size: int, pause: float, limit: int = None, rescan: bool = False) -> int:
+    journal = db.migrations.find_one({"_id": JOURNAL_ID}) or {}
+    position = None if rescan else journal.get("position")
+    # Counted once: a count per batch would scan the collection every time
+    total = db.scores.count_documents(LEGACY_FILTER if position is None else legacy_after(position))
+    print(f"{total} legacy documents to migrate")
+    migrated = 0
+    while limit is None or migrated < limit:
+        size = batch_size if limit is None else min(batch_size, limit - migrated)
+        query = LEGACY_FILTER if position is None else legacy_after(position)
+        legacy = list(db.scores.find(query).sort("_id", 1).limit(size))
+        if not legacy:
+            break
+        position = legacy[-1]["_id"]
+
+        try:
+            db.scores.insert_many([encode_score(document) for document in legacy], ordered=False)
+        except BulkWriteError as e:
+            # Copies left over from an interrupted run are fine, anything else is not
+            if any(error["code"] != DUPLICATE_KEY for error in e.details["writeErrors"]):
+                raise
+        db.scores.delete_many({"_id": {"$in": [document["_id"] for document in legacy]}})
+
+        migrated += len(legacy)
+        db.migrations.update_one(
+            {"_id": JOURNAL_ID},
+            {"$inc": {"migrated": len(legacy)}, "$set": {"position": position, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        print(f"Migrated {migrated} of {total} documents")
+        if pause:
+            time.sleep(pause)
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate scores to the compact document layout")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.2, help="seconds to sleep between batches")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many documents")
+    parser.add_argument("--stats-only", action="store_true", help="only print collection sizes")
+    parser.add_argument("--rescan", action="store_true", help="start from the first legacy document, not where the last run stopped")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = MongoClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    before = collection_stats(db)
+    print_stats("Before", before)
+    if args.stats_only:
+        return
+
+    started = time.perf_counter()
+    migrated = migrate(db, args.batch_size, args.pause, args.limit, args.rescan)
+    print(f"Migrated {migrated} documents in {time.perf_counter() - started:.1f}s")
+
+    # Let the server reclaim space freed by the rewritten documents
+    try:
+        db.command("compact", "scores")
+    except OperationFailure as e:
+        print(f"compact not run ({e}); storage size may only shrink later")
+    after = collection_stats(db)
+    print_stats("After", after)
+    if before["size"]:
+        print(f"Data size {100 * (after['size'] - before['size']) / before['size']:+.1f}%, "
+              f"index size {100 * (after['total_index_size'] - before['total_index_size']) / max(1, before['total_index_size']):+.1f}%")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
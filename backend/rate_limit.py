@@ -0,0 +1,226 @@
+"""
+In-process rate limiting and load shedding for the game API.
+
+Each client gets a token bucket per IP and, when it sends a valid bearer
+token, per user. Routes cost a configurable number of tokens so bcrypt and
+aggregation endpoints drain a bucket faster than cheap reads. On top of
+that, a load shedder rejects expensive requests early when the event loop
+is lagging or too many requests are already in flight.
+"""
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+# (method, path prefix, cost) - first match wins, anything else costs 1 token
+DEFAULT_ROUTE_COSTS = [
+    ("POST", "/api/login", 10),
+    ("POST", "/api/register", 10),
+    ("GET", "/api/scores/highscores/", 4),
+]
+
+# Requests at or above this cost are the first to go when shedding load
+SHED_MIN_COST = 4
+
+
+class TokenBucketTable:
+    """
+    Token buckets keyed by client identity, bounded to `max_entries`.
+
+    Each bucket is a `(tokens, last_refill)` tuple in an OrderedDict kept in
+    least-recently-seen order, so evicting the oldest client is O(1). An
+    evicted client simply starts again with a full bucket.
+    """
+
+    __slots__ = ("rate", "burst", "max_entries", "evictions", "_buckets")
+
+    def __init__(self, rate: float, burst: float, max_entries: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key: str, cost: float, now: float) -> float:
+        """
+        Take `cost` tokens from the bucket for `key`.
+        Returns 0 when allowed, otherwise the seconds until enough tokens refill.
+        """
+        entry = self._buckets.get(key)
+        if entry is None:
+            if len(self._buckets) >= self.max_entries:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+            tokens = self.burst
+        else:
+            tokens, last = entry
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            self._buckets.move_to_end(key)
+
+        if tokens >= cost:
+            self._buckets[key] = (tokens - cost, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (cost - tokens) / self.rate
+
+
+class LoadShedder:
+    """
+    Adaptive concurrency limit for expensive requests.
+
+    The limit follows AIMD: at most once per `adjust_interval` it is halved
+    if the observed event-loop lag passes `max_lag`, or grown back by one
+    towards `max_in_flight` otherwise.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_lag: float,
+        lag_source: Callable[[], float],
+        adjust_interval: float = 0.25,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_lag = max_lag
+        self.lag_source = lag_source
+        self.adjust_interval = adjust_interval
+        self.limit = max_in_flight
+        self.in_flight = 0
+        self.shed = 0
+        self._last_adjust = 0.0
+
+    def should_shed(self, now: float) -> bool:
+        if now - self._last_adjust >= self.adjust_interval:
+            self._last_adjust = now
+            if self.lag_source() > self.max_lag:
+                self.limit = max(1, self.limit // 2)
+            elif self.limit < self.max_in_flight:
+                self.limit += 1
+        return self.in_flight >= self.limit
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        ip_rate: float = 5.0,
+        ip_burst: float = 40.0,
+        user_rate: float = 5.0,
+        user_burst: float = 40.0,
+        max_entries: int = 10000,
+        route_costs: Optional[List[Tuple[str, str, int]]] = None,
+        max_in_flight: int = 64,
+        max_lag: float = 0.2,
+        trusted_proxies: Tuple[str, ...] = ("127.0.0.1", "::1"),
+        user_key_func: Optional[Callable[[str], Optional[str]]] = None,
+        lag_source: Callable[[], float] = lambda: 0.0,
+    ):
+        self.ip_buckets = TokenBucketTable(ip_rate, ip_burst, max_entries)
+        self.user_buckets = TokenBucketTable(user_rate, user_burst, max_entries)
+        self.route_costs = route_costs if route_costs is not None else DEFAULT_ROUTE_COSTS
+        self.trusted_proxies = trusted_proxies
+        self.user_key_func = user_key_func
+        self.shedder = LoadShedder(max_in_flight, max_lag, lag_source)
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls, environ, **kwargs):
+        """Build a limiter from RATE_LIMIT_* / SHED_* environment variables."""
+        return cls(
+            ip_rate=float(environ.get("RATE_LIMIT_IP_RATE", 5)),
+            ip_burst=float(environ.get("RATE_LIMIT_IP_BURST", 40)),
+            user_rate=float(environ.get("RATE_LIMIT_USER_RATE", 5)),
+            user_burst=float(environ.get("RATE_LIMIT_USER_BURST", 40)),
+            max_entries=int(environ.get("RATE_LIMIT_MAX_KEYS", 10000)),
+            max_in_flight=int(environ.get("SHED_MAX_IN_FLIGHT", 64)),
+            max_lag=float(environ.get("SHED_MAX_LAG_MS", 200)) / 1000,
+            **kwargs,
+        )
+
+    def route_cost(self, method: str, path: str) -> int:
+        for route_method, prefix, cost in self.route_costs:
+            if method == route_method and path.startswith(prefix):
+                return cost
+        return 1
+
+    def client_ip(self, scope, headers: Dict[bytes, bytes]) -> str:
+        peer = scope.get("client")
+        ip = peer[0] if peer else "unknown"
+        # Behind nginx every request comes from loopback, so trust its header
+        if ip in self.trusted_proxies and b"x-real-ip" in headers:
+            return headers[b"x-real-ip"].decode("latin-1")
+        return ip
+
+    def check(self, scope) -> Optional[JSONResponse]:
+        """Return a rejection response for this request, or None to let it through."""
+        method = scope["method"]
+        path = scope["path"]
+        cost = self.route_cost(method, path)
+        now = time.monotonic()
+
+        if cost >= SHED_MIN_COST and self.shedder.should_shed(now):
+            self.shedder.shed += 1
+            return JSONResponse(
+                {"detail": "Server is busy, please retry shortly"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+
+        headers = dict(scope["headers"])
+        wait = self.ip_buckets.take(self.client_ip(scope, headers), cost, now)
+
+        if not wait and self.user_key_func is not None:
+            auth = headers.get(b"authorization", b"").decode("latin-1")
+            if auth[:7].lower() == "bearer ":
+                user_key = self.user_key_func(auth[7:])
+                if user_key is not None:
+                    wait = self.user_buckets.take(user_key, cost, now)
+
+        if wait:
+            self.rejected += 1
+            return JSONResponse(
+                {"detail": "Too many requests"},
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+        return None
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "rejected": self.rejected,
+            "shed": self.shedder.shed,
+            "in_flight": self.shedder.in_flight,
+            "concurrency_limit": self.shedder.limit,
+            "ip_buckets": len(self.ip_buckets),
+            "user_buckets": len(self.user_buckets),
+            "evictions": self.ip_buckets.evictions + self.user_buckets.evictions,
+        }
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying a RateLimiter to every HTTP request."""
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rejection = self.limiter.check(scope)
+        if rejection is not None:
+            await rejection(scope, receive, send)
+            return
+
+        shedder = self.limiter.shedder
+        shedder.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            shedder.in_flight -= 1
@@ -0,0 +1,218 @@
+"""
+Retention and roll-up job for db.scores.
+
+Raw scores older than the retention window are folded into one summary per
+player and game in db.score_summaries:
+
+    {"_id": {"user_id": <UUID as binary>, "game_type": <code>},
+     "best": int, "count": int, "time_total": float, "timed": int,
+     "first_at": datetime, "last_at": datetime, "batches": [batch ids]}
+
+and then deleted. Two kinds of old rows are kept because the API still
+reads them: every player's best score per game, which keeps the rank index
+and the player's history intact, and the top --keep-top scores of each
+game, for highscores.
+
+The job walks old scores oldest first in small batches. After each batch
+it sleeps long enough that it is busy at most --duty of the time, so it
+never competes with live traffic for long. Before a batch writes
+anything, its ids are journaled in db.migrations. Summary updates skip
+batches a summary has already counted. An interrupted run can therefore
+be restarted at any point: the pending batch is finished without
+counting anything twice.
+
+Usage (from backend/):
+    python rollup_scores.py --retention-days 90 --batch-size 500 --duty 0.2
+    python rollup_scores.py --dry-run
+"""
+import argparse
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from migrate_scores import DUPLICATE_KEY, collection_stats, print_stats
+from score_store import decode_game_type, decode_uuid, game_type_filter, summary_id, user_id_filter
+
+JOURNAL_ID = "score_rollup"
+# Batch ids remembered per summary; only the last one matters after a restart
+BATCH_HISTORY = 5
+
+
+def protected_top_ids(db, keep_top: int) -> set:
+    """Ids of the best `keep_top` scores of every game (highscores)."""
+    ids = set()
+    for game_type in db.scores.distinct("game_type"):
+        top = db.scores.find({"game_type": game_type}, {"_id": 1}).sort("score", -1).limit(keep_top)
+        ids.update(document["_id"] for document in top)
+    return ids
+
+
+def best_score_id(db, user_id, game_type):
+    """Id of the player's best score for a game, whichever layout it is stored in."""
+    best = db.scores.find_one(
+        {"user_id": user_id_filter(decode_uuid(user_id)), "game_type": game_type_filter(decode_game_type(game_type))},
+        {"_id": 1},
+        sort=[("score", -1), ("created_at", 1)],
+    )
+    return best["_id"] if best else None
+
+
+def summary_updates(documents, batch_id: str):
+    groups = {}
+    for document in documents:
+        key = summary_id(document["user_id"], document["game_type"])
+        group = groups.setdefault((key["user_id"], key["game_type"]), {
+            "best": document["score"], "count": 0, "time_total": 0.0, "timed": 0,
+            "first_at": document["created_at"], "last_at": document["created_at"],
+        })
+        group["best"] = max(group["best"], document["score"])
+        group["count"] += 1
+        if document.get("time_taken") is not None:
+            group["time_total"] += document["time_taken"]
+            group["timed"] += 1
+        group["first_at"] = min(group["first_at"], document["created_at"])
+        group["last_at"] = max(group["last_at"], document["created_at"])
+
+    return [
+        UpdateOne(
+            {"_id": {"user_id": user_id, "game_type": game_type}, "batches": {"$ne": batch_id}},
+            {
+                "$inc": {"count": group["count"], "time_total": group["time_total"], "timed": group["timed"]},
+                "$max": {"best": group["best"], "last_at": group["last_at"]},
+                "$min": {"first_at": group["first_at"]},
+                "$push": {"batches": {"$each": [batch_id], "$slice": -BATCH_HISTORY}},
+            },
+            upsert=True,
+        )
+        for (user_id, game_type), group in groups.items()
+    ]
+
+
+def apply_batch(db, batch_id: str, ids) -> int:
+    """Fold the journaled rows into their summaries, then delete them."""
+    documents = list(db.scores.find({"_id": {"$in": ids}}))
+    updates = summary_updates(documents, batch_id)
+    if updates:
+        try:
+            db.score_summaries.bulk_write(updates, ordered=False)
+        except BulkWriteError as e:
+            # Upserting a summary that already counted this batch hits its _id: already done
+            if any(error["code"] != DUPLICATE_KEY for error in e.details["writeErrors"]):
+                raise
+    db.scores.delete_many({"_id": {"$in": ids}})
+    return len(documents)
+
+
+def rollup(db, cutoff: datetime, batch_size: int, keep_top: int, duty: float,
+           limit: int = None, dry_run: bool = False, rescan: bool = False):
+    journal = db.migrations.find_one({"_id": JOURNAL_ID}) or {}
+    if journal.get("pending") and not dry_run:
+        pending = journal["pending"]
+        finished = apply_batch(db, pending["batch"], pending["ids"])
+        db.migrations.update_one({"_id": JOURNAL_ID}, {"$unset": {"pending": ""}})
+        print(f"Finished interrupted batch {pending['batch']} ({finished} scores)")
+
+    protected = protected_top_ids(db, keep_top)
+    best_ids = {}
+    position = None if rescan else journal.get("position")
+    examined = rolled_up = 0
+    while limit is None or examined < limit:
+        started = time.perf_counter()
+        query = {"created_at": {"$lt": cutoff}}
+        if position is not None:
+            # Keyset pagination: rows after the last one examined, in (created_at, _id) order
+            query = {"$and": [query, {"$or": [
+                {"created_at": {"$gt": position["created_at"]}},
+                {"created_at": position["created_at"], "_id": {"$gt": position["_id"]}},
+            ]}]}
+        size = batch_size if limit is None else min(batch_size, limit - examined)
+        batch = list(
+            db.scores.find(query, {"_id": 1, "user_id": 1, "game_type": 1, "created_at": 1})
+            .sort([("created_at", 1), ("_id", 1)])
+            .limit(size)
+        )
+        if not batch:
+            break
+        position = {"created_at": batch[-1]["created_at"], "_id": batch[-1]["_id"]}
+        examined += len(batch)
+
+        ids = []
+        for document in batch:
+            key = tuple(summary_id(document["user_id"], document["game_type"]).values())
+            if key not in best_ids:
+                best_ids[key] = best_score_id(db, document["user_id"], document["game_type"])
+            if document["_id"] not in protected and document["_id"] != best_ids[key]:
+                ids.append(document["_id"])
+
+        if not dry_run:
+            batch_id = uuid.uuid4().hex
+            db.migrations.update_one(
+                {"_id": JOURNAL_ID},
+                {"$set": {"pending": {"batch": batch_id, "ids": ids}, "position": position,
+                          "updated_at": datetime.utcnow()}},
+                upsert=True,
+            )
+            apply_batch(db, batch_id, ids)
+            db.migrations.update_one(
+                {"_id": JOURNAL_ID},
+                {"$unset": {"pending": ""}, "$inc": {"rolled_up": len(ids), "kept": len(batch) - len(ids)}},
+            )
+        rolled_up += len(ids)
+        print(f"Examined {examined} old scores, rolled up {rolled_up}, kept {examined - rolled_up}")
+
+        # Stay busy at most `duty` of the time
+        busy = time.perf_counter() - started
+        if duty < 1:
+            time.sleep(busy * (1 - duty) / duty)
+    return examined, rolled_up
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll old scores up into per-player summaries")
+    parser.add_argument("--retention-days", type=float, default=float(os.environ.get("SCORE_RETENTION_DAYS", 90)))
+    parser.add_argument("--keep-top", type=int, default=100, help="scores kept per game for highscores")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--duty", type=float, default=0.2, help="largest share of time spent working (0-1]")
+    parser.add_argument("--limit", type=int, default=None, help="stop after examining this many scores")
+    parser.add_argument("--dry-run", action="store_true", help="count what would be rolled up, write nothing")
+    parser.add_argument("--rescan", action="store_true", help="start from the oldest score, not where the last run stopped")
+    args = parser.parse_args()
+    if not 0 < args.duty <= 1:
+        parser.error("--duty must be in (0, 1]")
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = MongoClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    before = collection_stats(db)
+    print_stats("Before", before)
+    cutoff = datetime.utcnow() - timedelta(days=args.retention_days)
+    print(f"Rolling up scores created before {cutoff:%Y-%m-%d %H:%M} UTC{' (dry run)' if args.dry_run else ''}")
+
+    started = time.perf_counter()
+    examined, rolled_up = rollup(db, cutoff, args.batch_size, args.keep_top, args.duty,
+                                 args.limit, args.dry_run, args.rescan)
+    print(f"Examined {examined} scores, rolled up {rolled_up} in {time.perf_counter() - started:.1f}s")
+
+    if rolled_up and not args.dry_run:
+        # Let the server reclaim space freed by the deleted documents
+        try:
+            db.command("compact", "scores")
+        except OperationFailure as e:
+            print(f"compact not run ({e}); storage size may only shrink later")
+        after = collection_stats(db)
+        print_stats("After", after)
+        print(f"Reclaimed {before['size'] - after['size']} B of data, "
+              f"{before['storage_size'] - after['storage_size']} B of storage, "
+              f"{before['total_index_size'] - after['total_index_size']} B of indexes")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
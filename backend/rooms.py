@@ -0,0 +1,371 @@
+"""
+Multiplayer Whac-A-Deficiency rooms.
+
+Several players share one board. Each room runs one asyncio task that moves
+the round forward in fixed ticks (TICK_MS). The server owns the board: it
+spawns items using the single-player rules from game_data. Whacks are queued
+as they arrive and resolved on the next tick in arrival order, so when two
+players hit the same item, the first whack received wins.
+
+Rare events use JSON text messages: welcome, join, leave, start, results and
+error. Each tick uses one small binary frame that only carries what changed.
+All binary values are little endian:
+
+    tick frame   <BIHBBB  kind=1, tick, ms left in the round,
+                          spawn count, hit count, score count, then
+    spawn        <HBBH    item id, hole, DEFICIENCY_CATALOG index, duration ms
+    hit          <HBh     item id, player slot, points
+    score        <Bi      player slot, total score
+
+    whack (client to server)  <BH  kind=1, item id
+
+An item disappears on the client once its duration has passed. If a round
+has no events, a frame without entries is still sent every KEEPALIVE_TICKS
+so clients keep their clocks in sync.
+"""
+import asyncio
+import json
+import random
+import secrets
+import struct
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from db_monitor import LatencyStats
+from game_data import COMBO_RESET_MS, COMBO_WINDOW_MS, DEFICIENCY_CATALOG, DIFFICULTIES, HOLES, ROUND_MS
+
+TICK_MS = 50
+KEEPALIVE_TICKS = 20
+MAX_PLAYERS = 8
+# Whacks sent just before an item vanished on screen still count
+HIT_GRACE_MS = 150
+# Frames waiting for a slow client before it is disconnected
+SEND_QUEUE_SIZE = 64
+LOBBY_IDLE_SECONDS = 120
+
+FRAME_TICK = 1
+INPUT_WHACK = 1
+
+TICK_HEADER = struct.Struct("<BIHBBB")
+SPAWN = struct.Struct("<HBBH")
+HIT = struct.Struct("<HBh")
+SCORE = struct.Struct("<Bi")
+WHACK = struct.Struct("<BH")
+
+CATALOG_RATES = [item["appearance_rate"] for item in DEFICIENCY_CATALOG]
+
+
+class RoomError(Exception):
+    pass
+
+
+class RoomPlayer:
+    def __init__(self, slot: int, user_id: str, username: str, socket):
+        self.slot = slot
+        self.user_id = user_id
+        self.username = username
+        self.socket = socket
+        self.score = 0
+        self.combo = 0
+        self.last_whack_ms = None
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.writer: Optional[asyncio.Task] = None
+        self.connected = True
+
+    def public(self) -> Dict[str, Any]:
+        return {"slot": self.slot, "username": self.username, "score": self.score}
+
+    def send(self, message):
+        """Queue a frame (bytes) or event (str); drop the player if they can't keep up."""
+        if not self.connected:
+            return
+        try:
+            self.outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            # Frames are deltas: skipping some would desync the client
+            self.connected = False
+            self.writer.cancel()
+
+    async def write_loop(self):
+        """Send queued messages until a None sentinel, then close the socket."""
+        try:
+            while True:
+                message = await self.outbox.get()
+                if message is None:
+                    break
+                if isinstance(message, bytes):
+                    await self.socket.send_bytes(message)
+                else:
+                    await self.socket.send_text(message)
+        except Exception:
+            pass
+        finally:
+            self.connected = False
+            try:
+                await self.socket.close()
+            except Exception:
+                pass
+
+
+class Room:
+    def __init__(self, room_id: str, difficulty: str, manager: "RoomManager", seed=None):
+        if difficulty not in DIFFICULTIES:
+            raise RoomError(f"Unknown difficulty: {difficulty}")
+        self.id = room_id
+        self.difficulty = difficulty
+        self.spawn_ms, self.duration_ms = DIFFICULTIES[difficulty]
+        self.manager = manager
+        self.rng = random.Random(seed)
+        self.players: Dict[int, RoomPlayer] = {}
+        self.status = "lobby"
+        self.created = time.monotonic()
+        self.tick = 0
+        self.now_ms = 0
+        self.next_spawn_ms = self.spawn_ms
+        self.next_item_id = 0
+        # item id -> (hole, catalog index, expires at ms)
+        self.items: Dict[int, tuple] = {}
+        self.busy_holes = set()
+        self.pending: List[tuple] = []
+        self.task: Optional[asyncio.Task] = None
+
+    # Players
+
+    def join(self, user_id: str, username: str, socket) -> RoomPlayer:
+        if self.status != "lobby":
+            raise RoomError("The round has already started")
+        if any(player.user_id == user_id for player in self.players.values()):
+            raise RoomError("Already in this room")
+        slot = next((s for s in range(MAX_PLAYERS) if s not in self.players), None)
+        if slot is None:
+            raise RoomError("Room is full")
+        player = RoomPlayer(slot, user_id, username, socket)
+        player.writer = asyncio.create_task(player.write_loop())
+        self.players[slot] = player
+        player.send(json.dumps({
+            "type": "welcome",
+            "room": self.id,
+            "slot": slot,
+            "difficulty": self.difficulty,
+            "tick_ms": TICK_MS,
+            "round_ms": ROUND_MS,
+            "players": [p.public() for p in self.players.values()],
+        }))
+        self.broadcast_event({"type": "join", "player": player.public()}, skip=player)
+        return player
+
+    def leave(self, player: RoomPlayer):
+        if self.players.get(player.slot) is not player:
+            return
+        del self.players[player.slot]
+        player.send(None)
+        self.broadcast_event({"type": "leave", "slot": player.slot})
+        if not self.players:
+            self.close()
+
+    def host(self) -> Optional[RoomPlayer]:
+        return self.players[min(self.players)] if self.players else None
+
+    def broadcast_event(self, event: Dict[str, Any], skip: RoomPlayer = None):
+        message = json.dumps(event)
+        for player in list(self.players.values()):
+            if player is not skip:
+                player.send(message)
+
+    def broadcast_frame(self, frame: bytes):
+        self.manager.frames_sent += 1
+        self.manager.bytes_sent += len(frame) * len(self.players)
+        for player in list(self.players.values()):
+            player.send(frame)
+            if not player.connected:
+                self.leave(player)
+
+    # Round
+
+    def start(self, player: RoomPlayer):
+        if player is not self.host():
+            raise RoomError("Only the host can start the round")
+        if self.status != "lobby":
+            raise RoomError("The round has already started")
+        self.status = "playing"
+        self.broadcast_event({"type": "start", "tick_ms": TICK_MS, "round_ms": ROUND_MS})
+        self.task = asyncio.create_task(self.run())
+
+    def whack(self, player: RoomPlayer, item_id: int):
+        if self.status == "playing":
+            self.pending.append((player, item_id))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            while self.now_ms < ROUND_MS and self.status == "playing":
+                # Sleep to an absolute deadline so slow ticks don't accumulate drift
+                deadline = started + (self.tick + 1) * TICK_MS / 1000
+                delay = deadline - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.manager.tick_lateness.add((loop.time() - deadline) * 1000)
+                frame = self.step()
+                if frame is not None:
+                    self.broadcast_frame(frame)
+            if self.status == "playing":
+                await self.finish()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Room {self.id} stopped: {e}")
+            self.close()
+
+    def step(self) -> Optional[bytes]:
+        """Advance one tick; returns the frame to broadcast, if any."""
+        self.tick += 1
+        self.now_ms = min(ROUND_MS, self.tick * TICK_MS)
+
+        hits, changed = [], set()
+        pending, self.pending = self.pending, []
+        for player, item_id in pending:
+            item = self.items.pop(item_id, None)
+            if item is None or self.players.get(player.slot) is not player:
+                continue  # already whacked by someone else, expired or player left
+            self.busy_holes.discard(item[0])
+            points = self.score_hit(player, DEFICIENCY_CATALOG[item[1]])
+            hits.append(HIT.pack(item_id, player.slot, points))
+            changed.add(player.slot)
+
+        for item_id, (hole, _, expires) in list(self.items.items()):
+            if expires <= self.now_ms:
+                del self.items[item_id]
+                self.busy_holes.discard(hole)
+
+        spawns = []
+        while self.next_spawn_ms <= self.now_ms:
+            spawn = self.spawn()
+            if spawn is not None:
+                spawns.append(spawn)
+            self.next_spawn_ms += self.spawn_ms
+
+        if not (spawns or hits) and self.tick % KEEPALIVE_TICKS:
+            return None
+        scores = [SCORE.pack(slot, self.players[slot].score) for slot in sorted(changed) if slot in self.players]
+        header = TICK_HEADER.pack(FRAME_TICK, self.tick, ROUND_MS - self.now_ms, len(spawns), len(hits), len(scores))
+        return b"".join([header, *spawns, *hits, *scores])
+
+    def spawn(self) -> Optional[bytes]:
+        free = [hole for hole in range(1, HOLES + 1) if hole not in self.busy_holes]
+        if not free:
+            return None
+        hole = self.rng.choice(free)
+        kind = self.rng.choices(range(len(DEFICIENCY_CATALOG)), weights=CATALOG_RATES)[0]
+        duration = self.duration_ms
+        if DEFICIENCY_CATALOG[kind]["type"] in ("bonus", "malus"):
+            duration = int(duration * 0.7)
+        item_id = self.next_item_id
+        self.next_item_id = (self.next_item_id + 1) & 0xFFFF
+        self.items[item_id] = (hole, kind, self.now_ms + duration + HIT_GRACE_MS)
+        self.busy_holes.add(hole)
+        return SPAWN.pack(item_id, hole, kind, duration)
+
+    def score_hit(self, player: RoomPlayer, item: Dict[str, Any]) -> int:
+        # Same combo rules as the single-player game
+        since_last = None if player.last_whack_ms is None else self.now_ms - player.last_whack_ms
+        if since_last is not None and since_last >= COMBO_RESET_MS:
+            player.combo = 0
+        multiplier = 3 if player.combo >= 10 else 2 if player.combo >= 5 else 1.5 if player.combo >= 3 else 1
+        player.last_whack_ms = self.now_ms
+        if item["type"] == "malus":
+            player.combo = 0
+            points = item["points"]
+        else:
+            player.combo = player.combo + 1 if since_last is not None and since_last < COMBO_WINDOW_MS else 1
+            points = round(item["points"] * multiplier)
+        before = player.score
+        player.score = max(0, player.score + points)
+        return player.score - before
+
+    async def finish(self):
+        self.status = "finished"
+        results = sorted((p.public() for p in self.players.values()), key=lambda p: -p["score"])
+        self.broadcast_event({"type": "results", "players": results})
+        self.manager.rounds_finished += 1
+        if self.manager.on_finish is not None:
+            try:
+                await self.manager.on_finish(self, list(self.players.values()))
+            except Exception as e:
+                print(f"Could not save results of room {self.id}: {e}")
+
+    def close(self):
+        if self.task is not None and not self.task.done() and self.task is not asyncio.current_task():
+            self.task.cancel()
+        for player in list(self.players.values()):
+            player.send(None)
+        self.players.clear()
+        self.status = "closed"
+        self.manager.rooms.pop(self.id, None)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "difficulty": self.difficulty,
+            "status": self.status,
+            "players": [p.public() for p in self.players.values()],
+        }
+
+
+class RoomManager:
+    def __init__(self, max_rooms: int = 500,
+                 on_finish: Optional[Callable[[Room, List[RoomPlayer]], Awaitable[None]]] = None):
+        self.max_rooms = max_rooms
+        self.on_finish = on_finish
+        self.rooms: Dict[str, Room] = {}
+        self.tick_lateness = LatencyStats()
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.rounds_finished = 0
+
+    def create(self, difficulty: str = "normal", seed=None) -> Room:
+        self.reap()
+        if len(self.rooms) >= self.max_rooms:
+            raise RoomError("Too many rooms, try again later")
+        room_id = secrets.token_urlsafe(6)
+        room = Room(room_id, difficulty, self, seed=seed)
+        self.rooms[room_id] = room
+        return room
+
+    def get(self, room_id: str) -> Optional[Room]:
+        return self.rooms.get(room_id)
+
+    def open_rooms(self) -> List[Dict[str, Any]]:
+        self.reap()
+        return [room.summary() for room in self.rooms.values() if room.status == "lobby"]
+
+    def reap(self):
+        """Close lobbies nobody joined and finished rounds everyone left."""
+        now = time.monotonic()
+        for room in list(self.rooms.values()):
+            idle = room.status == "lobby" and not room.players and now - room.created > LOBBY_IDLE_SECONDS
+            if idle or (room.status == "finished" and not room.players):
+                room.close()
+
+    def close_all(self):
+        for room in list(self.rooms.values()):
+            room.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        statuses = [room.status for room in self.rooms.values()]
+        return {
+            "rooms": len(self.rooms),
+            "playing": statuses.count("playing"),
+            "players": sum(len(room.players) for room in self.rooms.values()),
+            "rounds_finished": self.rounds_finished,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "tick_lateness": self.tick_lateness.snapshot(),
+        }
+
+
+def parse_input(data: bytes):
+    """Decode a client frame; returns (kind, item id) or None if malformed."""
+    if len(data) != WHACK.size:
+        return None
+    return WHACK.unpack(data)
@@ -0,0 +1,184 @@
+"""
+In-memory player ranking per game type.
+
+Each player counts once, with their best score. A Fenwick tree over score
+buckets (one bucket per integer score) answers "how many players scored
+above X" in O(log n), and selecting the bucket that holds a given rank is
+O(log n) too, so rank, percentile and "scores around me" never scan the
+scores collection.
+
+The tree starts small and doubles as higher scores arrive, up to
+`max_buckets`; scores beyond the last bucket share it, so one absurd score
+cannot make the tree allocate memory in proportion to its value.
+
+The index lives in the API process: it is loaded from db.scores at startup
+and updated by every score write. Updates only ever raise a player's best,
+so loading and live writes can interleave in any order.
+"""
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from score_store import decode_game_type, decode_uuid
+
+# Enough for any real score (see MAX_SCORE in server.py); about 1 MB per game
+MAX_BUCKETS = 1 << 17
+
+
+class FenwickTree:
+    """Counts per bucket with O(log n) prefix sums and rank selection."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._tree = [0] * (size + 1)
+
+    def add(self, bucket: int, delta: int):
+        i = bucket + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, bucket: int) -> int:
+        """Total count of buckets 0..bucket."""
+        i = min(bucket + 1, self.size)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def select(self, k: int) -> int:
+        """Smallest bucket whose prefix count reaches k (1-based)."""
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self._tree[nxt] < k:
+                position = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return position
+
+
+class GameRanking:
+    """Best score per player for one game type."""
+
+    def __init__(self, initial_size: int = 1024, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self.tree = FenwickTree(min(initial_size, max_buckets))
+        self.best: Dict[str, int] = {}
+        # Players per bucket; dicts keep insertion order, so ties list the
+        # player who reached the score first
+        self.buckets: Dict[int, Dict[str, None]] = {}
+
+    @property
+    def total(self) -> int:
+        return len(self.best)
+
+    def bucket(self, score: int) -> int:
+        # Negative scores (all maluses) share the lowest bucket, scores past
+        # the cap the highest one; players within a bucket rank as ties
+        return min(max(0, int(score)), self.max_buckets - 1)
+
+    def _grow(self, bucket: int):
+        size = self.tree.size
+        while size <= bucket:
+            size = min(size * 2, self.max_buckets)
+        tree = FenwickTree(size)
+        for b, players in self.buckets.items():
+            tree.add(b, len(players))
+        self.tree = tree
+
+    def update(self, user_id: str, score: int) -> bool:
+        """Record a score; returns True if it is the player's new best."""
+        previous = self.best.get(user_id)
+        if previous is not None and score <= previous:
+            return False
+        new_bucket = self.bucket(score)
+        if new_bucket >= self.tree.size:
+            self._grow(new_bucket)
+        if previous is not None:
+            old_bucket = self.bucket(previous)
+            self.tree.add(old_bucket, -1)
+            del self.buckets[old_bucket][user_id]
+            if not self.buckets[old_bucket]:
+                del self.buckets[old_bucket]
+        self.best[user_id] = score
+        self.tree.add(new_bucket, 1)
+        self.buckets.setdefault(new_bucket, {})[user_id] = None
+        return True
+
+    def above(self, score: int) -> int:
+        """Players whose best is in a higher bucket than `score`."""
+        return self.total - self.tree.prefix(self.bucket(score))
+
+    def rank(self, user_id: str) -> Optional[Dict[str, Any]]:
+        score = self.best.get(user_id)
+        if score is None:
+            return None
+        higher = self.above(score)
+        below = self.tree.prefix(self.bucket(score) - 1) if self.bucket(score) else 0
+        return {
+            "rank": higher + 1,
+            "total": self.total,
+            "best": score,
+            # Share of the other players this player is ahead of
+            "percentile": round(100 * below / (self.total - 1), 1) if self.total > 1 else 100.0,
+        }
+
+    def at_position(self, position: int) -> Tuple[str, int, int]:
+        """(user_id, best score, rank) of the 0-based position from the top."""
+        bucket = self.tree.select(self.total - position)
+        higher = self.total - self.tree.prefix(bucket)
+        user_id = next(islice(self.buckets[bucket], position - higher, None))
+        return user_id, self.best[user_id], higher + 1
+
+    def around(self, user_id: str, window: int) -> List[Tuple[str, int, int]]:
+        """Up to `window` players directly above and below `user_id`."""
+        score = self.best.get(user_id)
+        if score is None:
+            return []
+        bucket = self.bucket(score)
+        # Linear in the number of players tied with this one
+        position = self.above(score) + list(self.buckets[bucket]).index(user_id)
+        first = max(0, position - window)
+        last = min(self.total - 1, position + window)
+        return [self.at_position(p) for p in range(first, last + 1)]
+
+
+class RankIndex:
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self.games: Dict[str, GameRanking] = {}
+        self.ready = False
+
+    def game(self, game_type: str) -> GameRanking:
+        ranking = self.games.get(game_type)
+        if ranking is None:
+            ranking = self.games[game_type] = GameRanking(max_buckets=self.max_buckets)
+        return ranking
+
+    def update(self, user_id: str, game_type: str, score: int) -> bool:
+        return self.game(game_type).update(user_id, score)
+
+    def load(self, bests: Iterable[Dict[str, Any]]) -> int:
+        """Merge per-player bests shaped like the `best_scores_pipeline` output."""
+        loaded = 0
+        for row in bests:
+            self.update(decode_uuid(row["_id"]["user_id"]), decode_game_type(row["_id"]["game_type"]), row["best"])
+            loaded += 1
+        return loaded
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "games": {
+                game_type: {"players": ranking.total, "buckets": ranking.tree.size}
+                for game_type, ranking in self.games.items()
+            },
+        }
+
+
+def best_scores_pipeline() -> List[Dict[str, Any]]:
+    # A full collection scan, run once at startup; legacy and compact documents
+    # of the same player land in different groups and are merged by `load`
+    return [{"$group": {"_id": {"user_id": "$user_id", "game_type": "$game_type"}, "best": {"$max": "$score"}}}]
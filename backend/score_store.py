@@ -0,0 +1,117 @@
+"""
+Compact storage format for game scores.
+
+Score documents used to carry a 36-character string `id` next to Mongo's own
+`_id`, a 36-character string `user_id` and a free-text `game_type`. They are
+now stored as:
+
+    {"_id": <UUID as 16-byte binary>, "user_id": <UUID as binary>,
+     "game_type": <small int code>, "score": int, "time_taken": float?,
+     "created_at": datetime}
+
+Scores uploaded with a client idempotency key get an `_id` derived from the
+user and the key (`score_id_for_key`), so the unique `_id` index rejects a
+second upload of the same score without storing the key itself.
+
+The API shapes do not change: `decode_score` rebuilds the `GameScore` fields
+and reads both layouts, so the API keeps working while `migrate_scores.py`
+rewrites old documents.
+"""
+import uuid
+from typing import Any, Dict, Union
+
+from bson.binary import Binary, UuidRepresentation
+
+# Codes are part of the stored data: never renumber, only append
+GAME_TYPE_CODES = {
+    "whac_a_deficiency": 1,
+    "paris_metro": 2,
+    "whac_a_deficiency_room": 3,
+}
+GAME_TYPE_NAMES = {code: name for name, code in GAME_TYPE_CODES.items()}
+
+# Fixed namespace for idempotent score ids: never change it
+SCORE_KEY_NAMESPACE = uuid.UUID("6f1c2a4e-2b7d-4f0e-9a53-8d1e4c7b9f20")
+
+
+def encode_uuid(value: str) -> Union[Binary, str]:
+    """A UUID string as 16-byte binary; anything else is kept as it is."""
+    try:
+        return Binary.from_uuid(uuid.UUID(value), UuidRepresentation.STANDARD)
+    except (ValueError, TypeError, AttributeError):
+        return value
+
+
+def decode_uuid(value) -> str:
+    if isinstance(value, Binary):
+        return str(value.as_uuid(UuidRepresentation.STANDARD))
+    return str(value)
+
+
+def encode_game_type(game_type: str) -> Union[int, str]:
+    # Unknown game types are stored as free text rather than rejected
+    return GAME_TYPE_CODES.get(game_type, game_type)
+
+
+def decode_game_type(value) -> str:
+    return GAME_TYPE_NAMES.get(value, value) if isinstance(value, int) else value
+
+
+def game_type_filter(game_type: str) -> Dict[str, Any]:
+    """Matches a game type in both the compact and the legacy layout."""
+    code = encode_game_type(game_type)
+    return {"$in": [code, game_type]} if code != game_type else game_type
+
+
+def user_id_filter(user_id: str) -> Dict[str, Any]:
+    """Matches a user id in both the compact and the legacy layout."""
+    encoded = encode_uuid(user_id)
+    return {"$in": [encoded, user_id]} if encoded != user_id else user_id
+
+
+def score_id_for_key(user_id: str, idempotency_key: str) -> str:
+    """Stable score id for a client idempotency key, unique per user."""
+    return str(uuid.uuid5(SCORE_KEY_NAMESPACE, f"{user_id}:{idempotency_key}"))
+
+
+def summary_id(user_id, game_type) -> Dict[str, Any]:
+    """Key of a score summary; stored values of either layout give the same key."""
+    return {
+        "user_id": encode_uuid(decode_uuid(user_id)),
+        "game_type": encode_game_type(decode_game_type(game_type)),
+    }
+
+
+def encode_score(score: Dict[str, Any]) -> Dict[str, Any]:
+    """GameScore fields (or a legacy document) to a compact document."""
+    document = {
+        "_id": encode_uuid(score["id"]),
+        "user_id": encode_uuid(score["user_id"]),
+        "game_type": encode_game_type(score["game_type"]),
+        "score": score["score"],
+        "created_at": score["created_at"],
+    }
+    if score.get("time_taken") is not None:
+        document["time_taken"] = score["time_taken"]
+    return document
+
+
+def decode_score(document: Dict[str, Any]) -> Dict[str, Any]:
+    """A stored document, compact or legacy, to GameScore fields."""
+    return {
+        "id": document["id"] if "id" in document else decode_uuid(document["_id"]),
+        "user_id": decode_uuid(document["user_id"]),
+        "game_type": decode_game_type(document["game_type"]),
+        "score": document["score"],
+        "time_taken": document.get("time_taken"),
+        "created_at": document["created_at"],
+    }
+
+
+async def ensure_indexes(db):
+    # Highscores per game and per-user listings; both cover either layout
+    await db.scores.create_index([("game_type", 1), ("score", -1)])
+    await db.scores.create_index([("user_id", 1)])
+    # Oldest-first walk of the roll-up job (rollup_scores.py)
+    await db.scores.create_index([("created_at", 1), ("_id", 1)])
+    await db.score_summaries.create_index([("_id.user_id", 1)])
@@ -1,33 +1,111 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Body, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Body, Request, WebSocket, WebSocketDisconnect
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import sys
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, ValidationError
 from typing import List, Dict, Optional, Union, Any
 import uuid
 from datetime import datetime, timedelta
 import json
 import random
-from fastapi.responses import JSONResponse
+import asyncio
+import threading
+import time
+from fastapi.responses import JSONResponse, PlainTextResponse
 import jwt
 from passlib.context import CryptContext
+from pymongo.errors import BulkWriteError
 
 # Basic setup
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Sibling modules are imported by name whether uvicorn loads us as
+# `server:app` (Docker entrypoint) or `backend.server:app` (dev supervisor)
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from rate_limit import RateLimiter, RateLimitMiddleware
+from response_cache import ResponseCache
+from rooms import INPUT_WHACK, RoomError, RoomManager, parse_input
+from score_rank import RankIndex, best_scores_pipeline
+from score_store import (
+    decode_game_type, decode_score, encode_score, encode_uuid, ensure_indexes, game_type_filter, score_id_for_key,
+    user_id_filter,
+)
+from db_monitor import PoolMonitor
+from game_data import DEFICIENCY_CATALOG, ROUND_MS, load_metro_network
+from metro_challenges import ChallengePool
+from metro_timetable import Timetable
+from loop_monitor import LoopLagMonitor, RequestTrackingMiddleware, sample_stacks
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+db_pool_monitor = PoolMonitor()
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', 50)),
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', 2)),
+    waitQueueTimeoutMS=int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000)),
+    maxIdleTimeMS=int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 60000)),
+    # Safety net for writes, which cannot carry a maxTimeMS of their own
+    socketTimeoutMS=int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 10000)),
+    event_listeners=[db_pool_monitor],
+)
 db = client[os.environ['DB_NAME']]
 
+# Per-operation server-side time budgets (maxTimeMS), in milliseconds
+QUERY_TIMEOUT_MS = int(os.environ.get('MONGO_QUERY_TIMEOUT_MS', 1000))
+AGGREGATE_TIMEOUT_MS = int(os.environ.get('MONGO_AGGREGATE_TIMEOUT_MS', 3000))
+# The rank index load scans the whole scores collection once per attempt
+RANK_INDEX_TIMEOUT_MS = int(os.environ.get('MONGO_RANK_INDEX_TIMEOUT_MS', 60000))
+DUPLICATE_KEY = 11000
+
+# Largest batch accepted by POST /scores/batch
+SCORE_BATCH_MAX = int(os.environ.get('SCORE_BATCH_MAX', 100))
+# Largest score magnitude accepted from clients; a perfect hard round of
+# Whac-A-Deficiency is worth about 10,000
+MAX_SCORE = int(os.environ.get('MAX_SCORE', 100000))
+
 # Create the main app without a prefix
 app = FastAPI()
 
+# Cache for public read endpoints (TTLs in seconds)
+response_cache = ResponseCache()
+HIGHSCORES_CACHE_TTL = float(os.environ.get('HIGHSCORES_CACHE_TTL', 30))
+STATIC_CACHE_TTL = 300
+
+# Best score per player and game, for rank lookups without scanning db.scores
+rank_index = RankIndex()
+rank_index_task = None
+
+# Multiplayer Whac-A-Deficiency rooms, each ticking on the event loop
+room_manager = RoomManager(max_rooms=int(os.environ.get('MAX_ROOMS', 500)))
+RANK_AROUND_MAX = 10
+
+# Paris Metro network: the built-in one, or a JSON file that an admin can
+# edit and apply with POST /api/admin/paris-metro/reload
+METRO_NETWORK_FILE = os.environ.get('METRO_NETWORK_FILE')
+STATIONS, METRO_LINES, TRANSFER_MINUTES = load_metro_network(METRO_NETWORK_FILE)
+
+# Paris Metro challenges, graded from precomputed optimal routes
+METRO_ALTERNATIVES = int(os.environ.get('METRO_ALTERNATIVES', 3))
+ALTERNATIVE_RANK_PENALTY = 15
+challenge_pool = ChallengePool(max_alternatives=int(os.environ.get('METRO_ALTERNATIVES_CACHE', 4096)))
+challenge_pool.refresh(STATIONS, METRO_LINES)
+metro_timetable = Timetable(STATIONS, METRO_LINES, TRANSFER_MINUTES)
+
+# Event-loop lag monitoring
+loop_monitor = LoopLagMonitor(
+    threshold=float(os.environ.get('LOOP_LAG_THRESHOLD_MS', 100)) / 1000,
+)
+event_loop_thread_id = None
+
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
@@ -35,6 +113,7 @@ api_router = APIRouter(prefix="/api")
 SECRET_KEY = "SECRET_KEY_CHANGE_LATER_FOR_PRODUCTION"  # In production use os.environ.get("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ADMIN_USERNAMES = {name.strip() for name in os.environ.get("ADMIN_USERNAMES", "").split(",") if name.strip()}
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
@@ -80,9 +159,31 @@ class GameScore(BaseModel):
 
 class GameScoreCreate(BaseModel):
     game_type: str
-    score: int
+    score: int = Field(..., ge=-MAX_SCORE, le=MAX_SCORE)
     time_taken: Optional[float] = None
 
+class GameScoreBatchItem(GameScoreCreate):
+    idempotency_key: str = Field(..., min_length=1, max_length=64)
+    played_at: Optional[datetime] = None  # when the round ended on the client
+
+class GameScoreBatch(BaseModel):
+    # GameScoreBatchItem fields, validated one by one so that one bad
+    # score does not fail the whole batch
+    scores: List[Dict[str, Any]]
+
+class GameScoreBatchResult(BaseModel):
+    accepted: List[str]  # idempotency keys stored by this request
+    duplicates: List[str]  # idempotency keys that were already stored
+    rejected: List[str] = []  # idempotency keys of invalid scores, not stored
+
+class RoomCreate(BaseModel):
+    difficulty: str = "normal"
+
+class JourneyRequest(BaseModel):
+    origin: str
+    destination: str
+    departure: str  # "HH:MM"
+
 class WhacDeficiency(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -100,7 +201,7 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 async def get_user(username: str):
-    user = await db.users.find_one({"username": username})
+    user = await db.users.find_one({"username": username}, max_time_ms=QUERY_TIMEOUT_MS)
     if user:
         return User(**user)
 
@@ -122,6 +223,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def username_from_token(token: str) -> Optional[str]:
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except Exception:
+        return None
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=401,
@@ -141,6 +248,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         raise credentials_exception
     return user
 
+async def get_current_admin(current_user: User = Depends(get_current_user)):
+    if current_user.username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
 # Auth routes
 @api_router.post("/login", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
@@ -160,7 +272,9 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 @api_router.post("/register", response_model=UserResponse)
 async def register_user(user_create: UserCreate):
     # Check if user already exists
-    existing_user = await db.users.find_one({"username": user_create.username})
+    existing_user = await db.users.find_one(
+        {"username": user_create.username}, max_time_ms=QUERY_TIMEOUT_MS
+    )
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
@@ -192,190 +306,266 @@ async def create_score(
         score=score.score,
         time_taken=score.time_taken
     )
-    result = await db.scores.insert_one(game_score.dict())
+    result = await db.scores.insert_one(encode_score(game_score.dict()))
     print(f"Score created with ID: {result.inserted_id}")
+    response_cache.invalidate("highscores", game_type=score.game_type)
+    rank_index.update(current_user.id, score.game_type, score.score)
     return game_score
 
+@api_router.post("/scores/batch", response_model=GameScoreBatchResult)
+async def create_scores_batch(
+    batch: GameScoreBatch,
+    current_user: User = Depends(get_current_user)
+):
+    """Store queued scores; uploading the same idempotency key again is a no-op."""
+    if len(batch.scores) > SCORE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {SCORE_BATCH_MAX} scores per batch")
+    items, invalid = [], []
+    for raw in batch.scores:
+        try:
+            items.append(GameScoreBatchItem(**raw))
+        except ValidationError as e:
+            key = raw.get("idempotency_key")
+            # Without a usable key the client cannot be told which one it was
+            if isinstance(key, str):
+                invalid.append(key)
+            print(f"Rejected queued score {key!r}: {'; '.join(error['msg'] for error in e.errors())}")
+    if not items:
+        return GameScoreBatchResult(accepted=[], duplicates=[], rejected=invalid)
+
+    now = datetime.utcnow()
+    documents = []
+    for item in items:
+        played_at = item.played_at
+        if played_at is not None and played_at.tzinfo is not None:
+            played_at = (played_at - played_at.utcoffset()).replace(tzinfo=None)
+        game_score = GameScore(
+            id=score_id_for_key(current_user.id, item.idempotency_key),
+            user_id=current_user.id,
+            game_type=item.game_type,
+            score=item.score,
+            time_taken=item.time_taken,
+            # Client clocks are not trusted beyond "not in the future"
+            created_at=min(played_at, now) if played_at else now,
+        )
+        documents.append(encode_score(game_score.dict()))
+
+    # The _id is derived from the key, so the _id index rejects replays
+    rejected = set()
+    try:
+        await db.scores.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details["writeErrors"]
+        if any(error["code"] != DUPLICATE_KEY for error in errors):
+            raise
+        rejected = {error["index"] for error in errors}
+
+    accepted, duplicates, stored_game_types = [], [], set()
+    for index, item in enumerate(items):
+        if index in rejected:
+            duplicates.append(item.idempotency_key)
+        else:
+            accepted.append(item.idempotency_key)
+            stored_game_types.add(item.game_type)
+            rank_index.update(current_user.id, item.game_type, item.score)
+    print(f"Score batch for user {current_user.username}: {len(accepted)} stored, "
+          f"{len(duplicates)} duplicates, {len(invalid)} rejected")
+    for game_type in stored_game_types:
+        response_cache.invalidate("highscores", game_type=game_type)
+    return GameScoreBatchResult(accepted=accepted, duplicates=duplicates, rejected=invalid)
+
 @api_router.get("/scores/highscores/{game_type}", response_model=List[Dict[str, Any]])
+@response_cache.cached("highscores", ttl=HIGHSCORES_CACHE_TTL)
 async def get_highscores(game_type: str):
     print(f"Fetching highscores for game type: {game_type}")
-    pipeline = [
-        {"$match": {"game_type": game_type}},
-        {"$sort": {"score": -1}},
-        {"$limit": 10},
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "user_id",
-                "foreignField": "id",
-                "as": "user"
-            }
-        },
-        {"$unwind": "$user"},
+    documents = await db.scores.find(
+        {"game_type": game_type_filter(game_type)}
+    ).sort("score", -1).limit(10).max_time_ms(AGGREGATE_TIMEOUT_MS).to_list(10)
+    scores = [decode_score(document) for document in documents]
+    
+    # Scores no longer share the users' string id type, so join in Python
+    users = await db.users.find(
+        {"id": {"$in": list({score["user_id"] for score in scores})}},
+        {"_id": 0, "id": 1, "username": 1, "company": 1}
+    ).max_time_ms(QUERY_TIMEOUT_MS).to_list(None)
+    users_by_id = {user["id"]: user for user in users}
+    
+    highscores = [
         {
-            "$project": {
-                "_id": 0,
-                "id": 1,
-                "score": 1,
-                "time_taken": 1,
-                "created_at": 1,
-                "username": "$user.username",
-                "company": "$user.company"
-            }
+            "id": score["id"],
+            "score": score["score"],
+            "time_taken": score["time_taken"],
+            "created_at": score["created_at"],
+            "username": users_by_id[score["user_id"]]["username"],
+            "company": users_by_id[score["user_id"]].get("company")
         }
+        for score in scores
+        if score["user_id"] in users_by_id
     ]
-    
-    highscores = await db.scores.aggregate(pipeline).to_list(10)
     print(f"Found {len(highscores)} highscores")
     return highscores
 
+@api_router.get("/scores/rank/{game_type}")
+async def get_rank(
+    game_type: str,
+    username: Optional[str] = None,
+    around: int = 2,
+    current_user: User = Depends(get_current_user)
+):
+    """Rank and percentile of a player's best score, with the players next to them."""
+    if not rank_index.ready:
+        raise HTTPException(status_code=503, detail="Rankings are still loading")
+    player = current_user
+    if username and username != current_user.username:
+        player = await get_user(username)
+        if player is None:
+            raise HTTPException(status_code=404, detail="User not found")
+
+    ranking = rank_index.games.get(game_type)
+    rank = ranking.rank(player.id) if ranking else None
+    if rank is None:
+        raise HTTPException(status_code=404, detail="No score recorded for this game")
+    neighbours = ranking.around(player.id, max(0, min(around, RANK_AROUND_MAX)))
+
+    users = await db.users.find(
+        {"id": {"$in": [user_id for user_id, _, _ in neighbours]}},
+        {"_id": 0, "id": 1, "username": 1, "company": 1}
+    ).max_time_ms(QUERY_TIMEOUT_MS).to_list(None)
+    users_by_id = {user["id"]: user for user in users}
+    return {
+        "username": player.username,
+        **rank,
+        "around": [
+            {
+                "rank": neighbour_rank,
+                "score": score,
+                "username": users_by_id[user_id]["username"],
+                "company": users_by_id[user_id].get("company"),
+            }
+            for user_id, score, neighbour_rank in neighbours
+            if user_id in users_by_id
+        ],
+    }
+
 @api_router.get("/scores/user", response_model=List[GameScore])
 async def get_user_scores(current_user: User = Depends(get_current_user)):
     print(f"Fetching scores for user: {current_user.username}")
-    scores = await db.scores.find({"user_id": current_user.id}).to_list(100)
+    scores = await db.scores.find(
+        {"user_id": user_id_filter(current_user.id)}
+    ).max_time_ms(QUERY_TIMEOUT_MS).to_list(100)
     print(f"Found {len(scores)} scores for user")
-    return [GameScore(**score) for score in scores]
+    return [GameScore(**decode_score(score)) for score in scores]
+
+@api_router.get("/scores/user/summary")
+async def get_user_score_summary(current_user: User = Depends(get_current_user)):
+    """Best, count and average time per game, over raw and rolled-up scores."""
+    recent = await db.scores.aggregate([
+        {"$match": {"user_id": user_id_filter(current_user.id)}},
+        {"$group": {
+            "_id": "$game_type",
+            "best": {"$max": "$score"},
+            "count": {"$sum": 1},
+            "time_total": {"$sum": {"$ifNull": ["$time_taken", 0]}},
+            "timed": {"$sum": {"$cond": [{"$eq": [{"$ifNull": ["$time_taken", None]}, None]}, 0, 1]}},
+        }},
+    ], maxTimeMS=AGGREGATE_TIMEOUT_MS).to_list(None)
+    rolled_up = await db.score_summaries.find(
+        {"_id.user_id": encode_uuid(current_user.id)}
+    ).max_time_ms(QUERY_TIMEOUT_MS).to_list(None)
+
+    games = {}
+    for row in recent + [{**summary, "_id": summary["_id"]["game_type"]} for summary in rolled_up]:
+        game = games.setdefault(decode_game_type(row["_id"]), {"best": row["best"], "count": 0, "time_total": 0.0, "timed": 0})
+        game["best"] = max(game["best"], row["best"])
+        for field in ("count", "time_total", "timed"):
+            game[field] += row[field]
+    return [
+        {
+            "game_type": game_type,
+            "best": game["best"],
+            "count": game["count"],
+            "average_time": round(game["time_total"] / game["timed"], 2) if game["timed"] else None,
+        }
+        for game_type, game in games.items()
+    ]
 
 # Whac-A-Deficiency Game Routes
 @api_router.get("/whac-a-deficiency/deficiencies", response_model=List[WhacDeficiency])
+@response_cache.cached("deficiencies", ttl=STATIC_CACHE_TTL)
 async def get_deficiencies():
-    # Liste des déficiences nutritionnelles (à taper)
-    deficiencies = [
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Calcium",
-            "points": 10,
-            "appearance_rate": 0.2,
-            "description": "Essential for bone health",
-            "icon": "🦴",
-            "type": "deficiency"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Vitamin D",
-            "points": 15,
-            "appearance_rate": 0.15,
-            "description": "Helps with calcium absorption",
-            "icon": "☁️",
-            "type": "deficiency"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Iron",
-            "points": 20,
-            "appearance_rate": 0.15,
-            "description": "Crucial for blood health",
-            "icon": "🔴",
-            "type": "deficiency"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Magnesium",
-            "points": 25,
-            "appearance_rate": 0.1,
-            "description": "Important for muscle function",
-            "icon": "⚡",
-            "type": "deficiency"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Vitamin B12",
-            "points": 30,
-            "appearance_rate": 0.1,
-            "description": "Critical for nerve function",
-            "icon": "🧠",
-            "type": "deficiency"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Zinc",
-            "points": 35,
-            "appearance_rate": 0.05,
-            "description": "Supports immune system",
-            "icon": "🛡️",
-            "type": "deficiency"
-        },
-        # Bonus (à taper)
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Bolognaise",
-            "points": 30,
-            "appearance_rate": 0.07,
-            "description": "Délicieuse sauce pour pâtes",
-            "icon": "🍅",
-            "type": "bonus"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Pâtes",
-            "points": 25,
-            "appearance_rate": 0.08,
-            "description": "Base parfaite pour vos spaghetti",
-            "icon": "🍝",
-            "type": "bonus"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Parmesan",
-            "points": 20,
-            "appearance_rate": 0.05,
-            "description": "Fromage qui complète parfaitement les pâtes",
-            "icon": "🧀",
-            "type": "bonus"
-        },
-        # Malus (à éviter)
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Mayonnaise",
-            "points": -20,
-            "appearance_rate": 0.03,
-            "description": "Ne va pas du tout avec les spaghetti!",
-            "icon": "🥚",
-            "type": "malus"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Concombre",
-            "points": -15,
-            "appearance_rate": 0.03,
-            "description": "Pas dans mes spaghetti!",
-            "icon": "🥒",
-            "type": "malus"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Avocat",
-            "points": -25,
-            "appearance_rate": 0.02,
-            "description": "Garde ça pour ton guacamole!",
-            "icon": "🥑",
-            "type": "malus"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Ananas",
-            "points": -30,
-            "appearance_rate": 0.02,
-            "description": "L'hérésie ultime!",
-            "icon": "🍍",
-            "type": "malus"
-        }
+    return [WhacDeficiency(**deficiency) for deficiency in DEFICIENCY_CATALOG]
+
+# Multiplayer rooms
+async def save_room_results(room, players):
+    now = datetime.utcnow()
+    scores = [
+        GameScore(user_id=player.user_id, game_type="whac_a_deficiency_room", score=player.score,
+                  time_taken=ROUND_MS / 1000, created_at=now)
+        for player in players
     ]
-    
-    return [WhacDeficiency(**deficiency) for deficiency in deficiencies]
+    if not scores:
+        return
+    await db.scores.insert_many([encode_score(score.dict()) for score in scores])
+    for score in scores:
+        rank_index.update(score.user_id, score.game_type, score.score)
+    response_cache.invalidate("highscores", game_type="whac_a_deficiency_room")
 
-# Paris Metro Game Routes
-# For now, we'll use a simplified version of the Paris metro data
-STATIONS = {
-    "station1": {"name": "Bastille", "connections": [("station2", 2), ("station5", 4)]},
-    "station2": {"name": "Nation", "connections": [("station1", 2), ("station3", 3)]},
-    "station3": {"name": "Denfert-Rochereau", "connections": [("station2", 3), ("station4", 2)]},
-    "station4": {"name": "Montparnasse", "connections": [("station3", 2), ("station6", 3)]},
-    "station5": {"name": "République", "connections": [("station1", 4), ("station6", 5)]},
-    "station6": {"name": "Châtelet", "connections": [("station4", 3), ("station5", 5)]}
-}
+room_manager.on_finish = save_room_results
+
+@api_router.post("/rooms")
+async def create_room(room: RoomCreate, current_user: User = Depends(get_current_user)):
+    try:
+        created = room_manager.create(room.difficulty)
+    except RoomError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return created.summary()
+
+@api_router.get("/rooms")
+async def list_rooms():
+    return room_manager.open_rooms()
+
+@api_router.websocket("/rooms/{room_id}/ws")
+async def room_socket(websocket: WebSocket, room_id: str, token: str = ""):
+    # Browsers can't set headers on WebSockets, so the JWT comes in the query string
+    username = username_from_token(token)
+    user = await get_user(username) if username else None
+    if user is None:
+        await websocket.close(code=1008)
+        return
+    room = room_manager.get(room_id)
+    await websocket.accept()
+    try:
+        if room is None:
+            raise RoomError("Room not found")
+        player = room.join(user.id, user.username, websocket)
+    except RoomError as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=4000)
+        return
+
+    try:
+        while player.connected:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                command = parse_input(message["bytes"])
+                if command is not None and command[0] == INPUT_WHACK:
+                    room.whack(player, command[1])
+            elif message.get("text") is not None:
+                try:
+                    if json.loads(message["text"]).get("type") == "start":
+                        room.start(player)
+                except (RoomError, ValueError, AttributeError) as e:
+                    player.send(json.dumps({"type": "error", "detail": str(e)}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        room.leave(player)
 
+# Paris Metro Game Routes
 @api_router.get("/paris-metro/stations")
+@response_cache.cached("stations", ttl=STATIC_CACHE_TTL)
 async def get_stations():
     # Convert the Python dict to a format suitable for the frontend
     formatted_stations = {}
@@ -388,8 +578,59 @@ async def get_stations():
         }
     return formatted_stations
 
+@api_router.get("/paris-metro/challenge")
+async def get_challenge(tier: str = "normal"):
+    if tier not in challenge_pool.tiers:
+        raise HTTPException(status_code=400, detail=f"Unknown tier {tier}")
+    pair = challenge_pool.next_challenge(tier)
+    if pair is None:
+        raise HTTPException(status_code=404, detail="No challenge available")
+    origin, destination = pair
+    optimum = challenge_pool.optimum(origin, destination)
+    return {
+        "from": origin,
+        "to": destination,
+        "tier": challenge_pool.tier_for(optimum.hops, challenge_pool.transfers(optimum.route)),
+    }
+
+def parse_clock(value: str) -> int:
+    """
+    Convert "HH:MM" to minutes after midnight
+    """
+    try:
+        hours, minutes = (int(part) for part in value.split(":"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Time must be formatted as HH:MM")
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise HTTPException(status_code=400, detail="Time must be formatted as HH:MM")
+    return hours * 60 + minutes
+
+def format_clock(minutes: int) -> str:
+    return f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
+
+def plan_journey(origin: str, destination: str, departure: int):
+    journey = metro_timetable.journey(origin, destination, departure)
+    if journey is None:
+        return None
+    for leg in journey["legs"]:
+        leg["departure"] = format_clock(leg["departure"])
+        leg["arrival"] = format_clock(leg["arrival"])
+    journey["departure"] = format_clock(journey["departure"])
+    journey["arrival"] = format_clock(journey["arrival"])
+    return journey
+
+@api_router.post("/paris-metro/journey")
+async def get_journey(journey: JourneyRequest):
+    for station_id in (journey.origin, journey.destination):
+        if station_id not in STATIONS:
+            raise HTTPException(status_code=404, detail=f"Station {station_id} does not exist")
+    planned = plan_journey(journey.origin, journey.destination, parse_clock(journey.departure))
+    if planned is None:
+        raise HTTPException(status_code=404, detail="No train can make this journey at that time")
+    return planned
+
 @api_router.post("/paris-metro/check-route")
-async def check_route(route: List[str] = Body(...)):
+async def check_route(route: List[str] = Body(...), departure: Optional[str] = None):
     # Check if the route is valid
     if len(route) < 2:
         return {"valid": False, "message": "Route must have at least two stations"}
@@ -416,15 +657,34 @@ async def check_route(route: List[str] = Body(...)):
         if not connection_found:
             return {"valid": False, "message": f"No direct connection from {STATIONS[from_station]['name']} to {STATIONS[to_station]['name']}"}
     
-    # Calculate the optimal route using Dijkstra's algorithm
-    optimal_route, optimal_time = dijkstra(STATIONS, route[0], route[-1])
+    # Look up the precomputed optimum, falling back to Dijkstra's algorithm
+    optimum = challenge_pool.optimum(route[0], route[-1])
+    if optimum is not None:
+        optimal_route, optimal_time = optimum.route, optimum.time
+    else:
+        optimal_route, optimal_time = dijkstra(STATIONS, route[0], route[-1])
+    
+    # Rank the player's route among the fastest alternatives
+    alternatives = challenge_pool.alternatives(route[0], route[-1], METRO_ALTERNATIVES)
+    route_rank = None
+    for rank, (_, alternative) in enumerate(alternatives, start=1):
+        if alternative == route:
+            route_rank = rank
+            break
     
     return {
         "valid": True,
         "route_time": total_time,
         "optimal_time": optimal_time,
         "optimal_route": optimal_route,
-        "score": calculate_score(total_time, optimal_time)
+        "route_rank": route_rank,
+        "alternatives": [
+            {"rank": rank, "route": alternative, "time": time}
+            for rank, (time, alternative) in enumerate(alternatives, start=1)
+        ],
+        "score": calculate_score(total_time, optimal_time, route_rank),
+        # Timetabled optimum (waiting and line changes included) when a departure time is given
+        "scheduled": plan_journey(route[0], route[-1], parse_clock(departure)) if departure else None
     }
 
 def dijkstra(graph, start, end):
@@ -459,9 +719,9 @@ def dijkstra(graph, start, end):
             break
         
         # Update distances to neighbors
-        for neighbor, time in graph[current]["connections"]:
+        for neighbor, minutes in graph[current]["connections"]:
             if neighbor not in visited:
-                distance = distances[current] + time
+                distance = distances[current] + minutes
                 if distance < distances[neighbor]:
                     distances[neighbor] = distance
                     previous[neighbor] = current
@@ -477,9 +737,11 @@ def dijkstra(graph, start, end):
     
     return path, distances[end]
 
-def calculate_score(route_time, optimal_time):
+def calculate_score(route_time, optimal_time, route_rank=None):
     """
-    Calculate a score based on how close the route is to the optimal route
+    Calculate a score based on how close the route is to the optimal route.
+    Routes among the fastest alternatives score at least 100 minus a small
+    penalty per rank, however much slower they are.
     """
     if route_time == optimal_time:
         return 100  # Perfect score
@@ -488,8 +750,61 @@ def calculate_score(route_time, optimal_time):
     penalty = (route_time - optimal_time) / optimal_time * 100
     score = max(0, 100 - penalty)
     
+    if route_rank is not None:
+        score = max(score, 100 - ALTERNATIVE_RANK_PENALTY * (route_rank - 1))
+    
     return int(score)
 
+# Admin routes
+@api_router.get("/admin/metrics")
+async def get_metrics(admin: User = Depends(get_current_admin)):
+    return {
+        "db_pool": db_pool_monitor.snapshot(),
+        "rate_limit": rate_limiter.snapshot(),
+        "event_loop": loop_monitor.snapshot(),
+        "metro_challenges": challenge_pool.snapshot(),
+        "response_cache": response_cache.snapshot(),
+        "rank_index": rank_index.snapshot(),
+        "rooms": room_manager.snapshot(),
+    }
+
+@api_router.post("/admin/paris-metro/reload")
+async def reload_metro_network(admin: User = Depends(get_current_admin)):
+    global STATIONS, METRO_LINES, TRANSFER_MINUTES, metro_timetable
+    # Only origins whose shortest paths are touched by the changes are
+    # recomputed. Nothing is swapped in unless every step succeeds, and
+    # nothing awaits in between, so routes never see a mix of the old and
+    # new networks
+    try:
+        stations, lines, transfer_minutes = load_metro_network(METRO_NETWORK_FILE)
+        timetable = Timetable(stations, lines, transfer_minutes)
+        recomputed = challenge_pool.refresh(stations, lines)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Cannot load the metro network: {e}")
+    STATIONS, METRO_LINES, TRANSFER_MINUTES, metro_timetable = stations, lines, transfer_minutes, timetable
+    response_cache.invalidate("stations")
+    return {"recomputed_origins": recomputed, **challenge_pool.snapshot()}
+
+@api_router.get("/admin/profile", response_class=PlainTextResponse)
+async def profile_server(
+    seconds: float = 10,
+    interval_ms: float = 5,
+    admin: User = Depends(get_current_admin)
+):
+    # Sample the event-loop thread from a worker thread while it keeps serving
+    seconds = min(max(seconds, 0.1), 60)
+    interval = min(max(interval_ms, 1), 100) / 1000
+    try:
+        collapsed = await asyncio.get_running_loop().run_in_executor(
+            None, sample_stacks, event_loop_thread_id, seconds, interval
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'},
+    )
+
 # Root route (for health check)
 @api_router.get("/")
 async def root():
@@ -498,6 +813,16 @@ async def root():
 # Include the router in the main app
 app.include_router(api_router)
 
+# Rate limiting (added before CORS so rejections still carry CORS headers)
+rate_limiter = RateLimiter.from_env(
+    os.environ, user_key_func=username_from_token, lag_source=loop_monitor.current_lag
+)
+if os.environ.get("RATE_LIMIT_ENABLED", "true").lower() != "false":
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
+# Outermost, so stalls are attributed to every request that reaches the app
+app.add_middleware(RequestTrackingMiddleware, monitor=loop_monitor)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -514,6 +839,60 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    try:
+        await ensure_indexes(db)
+    except Exception as e:
+        logger.warning(f"Could not create indexes: {e}")
+
+async def load_rank_index():
+    started = time.perf_counter()
+    loaded, rows = 0, []
+    cursor = db.scores.aggregate(best_scores_pipeline(), allowDiskUse=True, maxTimeMS=RANK_INDEX_TIMEOUT_MS)
+    async for row in cursor:
+        rows.append(row)
+        if len(rows) >= 1000:
+            loaded += rank_index.load(rows)
+            rows = []
+    loaded += rank_index.load(rows)
+    # Bests of rolled-up scores (rollup_scores.py keeps those rows too, this is a safety net)
+    summaries = await db.score_summaries.find({}, {"best": 1}).max_time_ms(RANK_INDEX_TIMEOUT_MS).to_list(None)
+    loaded += rank_index.load(summaries)
+    rank_index.ready = True
+    logger.info(f"Rank index loaded {loaded} player bests in {time.perf_counter() - started:.1f}s")
+
+async def load_rank_index_until_ready(max_delay: float = 60):
+    # Mongo may come up after the API (Docker entrypoint); retry with
+    # jittered exponential backoff. Loading only ever raises bests, so rows
+    # merged by a failed attempt are harmless
+    attempt = 0
+    while not rank_index.ready:
+        try:
+            await load_rank_index()
+        except Exception as e:
+            delay = min(max_delay, 2 ** attempt)
+            delay = delay / 2 + random.random() * delay / 2
+            attempt += 1
+            logger.warning(f"Could not load rank index (attempt {attempt}): {e}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+@app.on_event("startup")
+async def start_rank_index():
+    # Loads in the background; live score writes are applied meanwhile
+    global rank_index_task
+    rank_index_task = asyncio.create_task(load_rank_index_until_ready())
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    global event_loop_thread_id
+    event_loop_thread_id = threading.get_ident()
+    loop_monitor.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if rank_index_task is not None:
+        rank_index_task.cancel()
+    room_manager.close_all()
+    await loop_monitor.stop()
     client.close()
@@ -6,7 +6,8 @@ cd /backend || { echo "Backend directory not found"; exit 1; }
 
 echo "Starting FastAPI backend"
 # Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+# Keep idle connections open longer than nginx's upstream keepalive_timeout (60s)
+uvicorn server:app --host 0.0.0.0 --port 8001 --timeout-keep-alive 75 &
 BACKEND_PID=$!
 
 echo "Waiting for backend to start..."
@@ -2,6 +2,7 @@ import { useState, useEffect, useRef } from "react";
 import { BrowserRouter, Routes, Route, Link, Navigate, useNavigate, useLocation } from "react-router-dom";
 import axios from "axios";
 import "./App.css";
+import { flushScores, submitScore } from "./scoreQueue";
 
 // API Configuration
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -24,6 +25,8 @@ function AuthProvider({ children }) {
       })
       .then(response => {
         setUser(response.data);
+        // Envoyer les scores restés en attente lors de la dernière session
+        flushScores();
       })
       .catch(error => {
         console.error("Error fetching user:", error);
@@ -56,6 +59,7 @@ function AuthProvider({ children }) {
       });
       
       setUser(userResponse.data);
+      flushScores();
       return true;
     } catch (error) {
       console.error("Login error:", error);
@@ -640,26 +644,18 @@ function WhacADeficiency({ onScoreUpdate }) {
       time_taken: gameMode === 'survival' ? survivalLevel * 15 : 60
     });
     
-    // Sauvegarder le score dans le backend
+    // Sauvegarder le score dans le backend (mis en file si hors ligne)
     try {
-      const response = await axios.post(
-        `${API}/scores`, 
-        {
-          game_type: "whac_a_deficiency",
-          score: score,
-          time_taken: gameMode === 'survival' ? survivalLevel * 15 : 60
-        },
-        {
-          headers: { 
-            Authorization: `Bearer ${localStorage.getItem("token")}` 
-          }
-        }
-      );
+      const saved = await submitScore({
+        game_type: "whac_a_deficiency",
+        score: score,
+        time_taken: gameMode === 'survival' ? survivalLevel * 15 : 60
+      });
       
-      console.log("Whac-A-Deficiency: Score saved successfully", response.data);
+      console.log(saved ? "Whac-A-Deficiency: Score saved successfully" : "Whac-A-Deficiency: Score queued for upload");
       
       // Notifier que le score a été mis à jour
-      if (onScoreUpdate) {
+      if (saved && onScoreUpdate) {
         console.log("Whac-A-Deficiency: Notifying score update");
         onScoreUpdate();
       }
@@ -1044,7 +1040,7 @@ function ParisMetro({ onScoreUpdate }) {
   }, [gameStarted, gameOver]);
   
   // Start the game
-  const startGame = () => {
+  const startGame = async () => {
     // Reset state
     setGameStarted(true);
     setGameOver(false);
@@ -1062,41 +1058,22 @@ function ParisMetro({ onScoreUpdate }) {
       20
     );
     
-    // Choose stations based on level complexity
-    const stationIds = Object.keys(stations);
-    if (stationIds.length >= 2) {
-      let station1, station2;
-      
-      // For easier levels, choose stations that are closer
-      if (level <= 2) {
-        // Pour les niveaux faciles, choisir des stations proches
-        station1 = stationIds[Math.floor(Math.random() * stationIds.length)];
-        
-        // Trouver des stations connectées directement
-        const directConnections = stations[station1]?.connections || [];
-        if (directConnections.length > 0) {
-          const randomConnection = directConnections[Math.floor(Math.random() * directConnections.length)];
-          station2 = randomConnection.to;
-        } else {
-          // Fallback si pas de connexion directe
-          do {
-            station2 = stationIds[Math.floor(Math.random() * stationIds.length)];
-          } while (station2 === station1);
-        }
-      } else {
-        // Pour les niveaux plus difficiles, choisir des stations éloignées
-        station1 = stationIds[Math.floor(Math.random() * stationIds.length)];
-        
-        do {
-          station2 = stationIds[Math.floor(Math.random() * stationIds.length)];
-        } while (station2 === station1);
-      }
-      
-      setSelectedStations([station1, station2]);
+    // Ask the backend for a precomputed challenge matching the level complexity
+    // Pour les niveaux faciles, des stations proches; ensuite de plus en plus éloignées
+    const tier = level <= 2 ? 'easy' : level <= 4 ? 'normal' : 'hard';
+    try {
+      const response = await axios.get(`${API}/paris-metro/challenge`, {
+        params: { tier }
+      });
+      setSelectedStations([response.data.from, response.data.to]);
       
       // Afficher un message d'encouragement
       setFeedbackMessage('Trouvez le chemin le plus rapide entre ces deux stations!');
       setFeedbackType('info');
+    } catch (error) {
+      console.error("Error fetching challenge:", error);
+      setFeedbackMessage("Erreur lors du chargement du défi");
+      setFeedbackType("error");
     }
   };
   
@@ -1162,26 +1139,18 @@ function ParisMetro({ onScoreUpdate }) {
                        20 - timeLeft
           });
           
-          const response = await axios.post(
-            `${API}/scores`, 
-            {
-              game_type: "paris_metro",
-              score: routeScore,
-              time_taken: difficulty === 'easy' ? 45 - timeLeft : 
-                         difficulty === 'normal' ? 30 - timeLeft : 
-                         20 - timeLeft
-            },
-            {
-              headers: { 
-                Authorization: `Bearer ${localStorage.getItem("token")}` 
-              }
-            }
-          );
+          const saved = await submitScore({
+            game_type: "paris_metro",
+            score: routeScore,
+            time_taken: difficulty === 'easy' ? 45 - timeLeft : 
+                       difficulty === 'normal' ? 30 - timeLeft : 
+                       20 - timeLeft
+          });
           
-          console.log("Paris Metro: Score saved successfully", response.data);
+          console.log(saved ? "Paris Metro: Score saved successfully" : "Paris Metro: Score queued for upload");
           
           // Notifier que le score a été mis à jour
-          if (onScoreUpdate) {
+          if (saved && onScoreUpdate) {
             console.log("Paris Metro: Notifying score update");
             onScoreUpdate();
           }
@@ -1447,6 +1416,21 @@ function ParisMetro({ onScoreUpdate }) {
                     ))}
                   </div>
                 </div>
+
+                {result.alternatives && result.alternatives.length > 1 && (
+                  <div className="mt-3">
+                    <div className="font-bold mb-1">
+                      {result.route_rank
+                        ? `Votre itinéraire est le n°${result.route_rank} des plus rapides`
+                        : "Autres itinéraires rapides :"}
+                    </div>
+                    {result.alternatives.slice(1).map(alternative => (
+                      <div key={alternative.rank} className="text-sm">
+                        {alternative.rank}. {alternative.route.map(stationId => stations[stationId]?.name).join(' → ')} ({alternative.time} min)
+                      </div>
+                    ))}
+                  </div>
+                )}
               </>
             )}
           </div>
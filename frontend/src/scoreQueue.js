@@ -0,0 +1,149 @@
+import axios from "axios";
+
+// File d'attente locale des scores : rien n'est perdu quand le Wi-Fi tombe
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+const QUEUE_PREFIX = "pendingScores:";
+const BATCH_SIZE = 50; // must stay <= SCORE_BATCH_MAX on the backend
+const MAX_QUEUED = 500;
+const RETRY_BASE_MS = 2000;
+const RETRY_MAX_MS = 5 * 60 * 1000;
+
+let flushing = null;
+let retryTimer = null;
+let retryAttempt = 0;
+
+// Une file par joueur (le "sub" du JWT), pour ne jamais envoyer les scores
+// d'un joueur avec le token d'un autre
+function queueKey() {
+  const token = localStorage.getItem("token");
+  try {
+    const payload = JSON.parse(atob(token.split(".")[1].replace(/-/g, "+").replace(/_/g, "/")));
+    return QUEUE_PREFIX + payload.sub;
+  } catch (error) {
+    return null;
+  }
+}
+
+function readQueue(key = queueKey()) {
+  try {
+    return (key && JSON.parse(localStorage.getItem(key))) || [];
+  } catch (error) {
+    return [];
+  }
+}
+
+function writeQueue(queue, key = queueKey()) {
+  if (key) {
+    localStorage.setItem(key, JSON.stringify(queue.slice(-MAX_QUEUED)));
+  }
+}
+
+function newKey() {
+  if (window.crypto && window.crypto.randomUUID) {
+    return window.crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+}
+
+function scheduleRetry() {
+  if (retryTimer) return;
+  // Backoff exponentiel avec jitter : après une coupure, les clients ne
+  // reviennent pas tous en même temps
+  const ceiling = Math.min(RETRY_MAX_MS, RETRY_BASE_MS * 2 ** retryAttempt);
+  const delay = ceiling / 2 + Math.random() * (ceiling / 2);
+  retryAttempt += 1;
+  retryTimer = setTimeout(() => {
+    retryTimer = null;
+    flushScores();
+  }, delay);
+}
+
+async function sendBatches() {
+  const key = queueKey();
+  const token = localStorage.getItem("token");
+  let queue = readQueue(key);
+  while (queue.length > 0) {
+    if (!navigator.onLine || localStorage.getItem("token") !== token) {
+      return false;
+    }
+
+    const batch = queue.slice(0, BATCH_SIZE);
+    try {
+      const response = await axios.post(
+        `${API}/scores/batch`,
+        { scores: batch },
+        { headers: { Authorization: `Bearer ${token}` } }
+      );
+      const { accepted, duplicates, rejected = [] } = response.data;
+      // Scores the server found invalid (or did not answer for) would be
+      // rejected again on every retry: drop them, keep the rest of the queue
+      const answered = new Set([...accepted, ...duplicates, ...rejected]);
+      const dropped = [
+        ...rejected,
+        ...batch.map(item => item.idempotency_key).filter(itemKey => !answered.has(itemKey)),
+      ];
+      if (dropped.length > 0) {
+        console.error("Dropping scores rejected by the server:", dropped);
+      }
+      const done = new Set([...accepted, ...duplicates, ...dropped]);
+      // Re-read: another tab or a new score may have changed the queue meanwhile
+      queue = readQueue(key).filter(item => !done.has(item.idempotency_key));
+      writeQueue(queue, key);
+      retryAttempt = 0;
+    } catch (error) {
+      const status = error.response && error.response.status;
+      if (status === 401) {
+        // Token expiré : on garde les scores jusqu'à la prochaine connexion
+        return false;
+      }
+      if (status && status < 500 && status !== 429) {
+        // The whole request was refused (invalid scores alone come back in
+        // `rejected` above), retrying won't help
+        console.error("Dropping scores rejected by the server:", error.response.data);
+        const rejected = new Set(batch.map(item => item.idempotency_key));
+        queue = readQueue(key).filter(item => !rejected.has(item.idempotency_key));
+        writeQueue(queue, key);
+        continue;
+      }
+      console.error("Score upload failed, will retry:", error.message);
+      scheduleRetry();
+      return false;
+    }
+  }
+  return true;
+}
+
+// Envoie les scores en attente ; un seul envoi à la fois par onglet
+export function flushScores() {
+  if (!flushing) {
+    flushing = sendBatches().finally(() => {
+      flushing = null;
+    });
+  }
+  return flushing;
+}
+
+// Met un score en file et tente de l'envoyer ; résout à true si tout est parti
+export async function submitScore(score) {
+  if (!queueKey()) {
+    return false;
+  }
+  const queue = readQueue();
+  queue.push({
+    ...score,
+    idempotency_key: newKey(),
+    played_at: new Date().toISOString(),
+  });
+  writeQueue(queue);
+  if (flushing) {
+    await flushing;
+  }
+  return flushScores();
+}
+
+window.addEventListener("online", () => {
+  retryAttempt = 0;
+  flushScores();
+});
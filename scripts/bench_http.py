@@ -0,0 +1,94 @@
+"""
+HTTP serving benchmark: bytes on the wire and requests/second per endpoint.
+
+Runs the same request mix against one or more base URLs so the plain
+uvicorn backend can be compared with the nginx production profile, e.g.
+
+    python scripts/bench_http.py http://127.0.0.1:8001 http://127.0.0.1:8080
+
+Bytes are counted as received (status line, headers and body, before any
+decompression), so compression savings show up directly. Pass
+--no-keepalive to open a new connection for every request.
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = [
+    "/api/paris-metro/stations",
+    "/api/whac-a-deficiency/deficiencies",
+    "/api/scores/highscores/whac_a_deficiency",
+    "/api/scores/highscores/paris_metro",
+]
+
+
+def worker(base_url, path, requests, keepalive, results):
+    parts = urlsplit(base_url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    headers = {"Accept-Encoding": "gzip, br", "Connection": "keep-alive" if keepalive else "close"}
+    connection = None
+    for _ in range(requests):
+        if connection is None:
+            connection = connection_class(parts.hostname, parts.port, timeout=10)
+        started = time.perf_counter()
+        connection.request("GET", parts.path.rstrip("/") + path, headers=headers)
+        response = connection.getresponse()
+        body = response.read()
+        elapsed = time.perf_counter() - started
+        header_bytes = sum(len(name) + len(value) + 4 for name, value in response.getheaders()) + 17
+        results.append((elapsed, header_bytes + len(body), response.status, response.getheader("Content-Encoding")))
+        if not keepalive or response.will_close:
+            connection.close()
+            connection = None
+    if connection is not None:
+        connection.close()
+
+
+def bench(base_url, path, total, concurrency, keepalive):
+    results = []
+    per_worker = max(1, total // concurrency)
+    threads = [
+        threading.Thread(target=worker, args=(base_url, path, per_worker, keepalive, results))
+        for _ in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies = sorted(r[0] for r in results)
+    return {
+        "requests": len(results),
+        "rps": len(results) / wall,
+        "avg_bytes": statistics.mean(r[1] for r in results),
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(0.99 * (len(latencies) - 1))] * 1000,
+        "errors": sum(1 for r in results if r[2] >= 400),
+        "encoding": results[-1][3] or "identity",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes-on-wire and throughput benchmark")
+    parser.add_argument("base_urls", nargs="+", help="e.g. http://127.0.0.1:8001 http://127.0.0.1:8080")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per path and base URL")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--no-keepalive", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'base url':<28} {'path':<42} {'req/s':>8} {'bytes':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}  encoding")
+    for base_url in args.base_urls:
+        for path in args.paths:
+            r = bench(base_url, path, args.requests, args.concurrency, not args.no_keepalive)
+            print(f"{base_url:<28} {path:<42} {r['rps']:>8.0f} {r['avg_bytes']:>8.0f} "
+                  f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>6}  {r['encoding']}")
+
+
+if __name__ == "__main__":
+    main()
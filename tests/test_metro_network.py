@@ -0,0 +1,96 @@
+import copy
+import json
+
+import pytest
+
+from game_data import METRO_LINES, STATIONS, TRANSFER_MINUTES, load_metro_network
+from metro_challenges import ChallengePool
+
+
+def network_file(tmp_path, change=None):
+    network = {
+        "stations": {k: {"name": v["name"], "connections": [list(c) for c in v["connections"]]} for k, v in STATIONS.items()},
+        "lines": copy.deepcopy(METRO_LINES),
+        "transfer_minutes": TRANSFER_MINUTES,
+    }
+    if change:
+        change(network)
+    path = tmp_path / "network.json"
+    path.write_text(json.dumps(network))
+    return str(path)
+
+
+def test_builtin_network_without_a_file():
+    assert load_metro_network(None) == (STATIONS, METRO_LINES, TRANSFER_MINUTES)
+
+
+def test_file_round_trip(tmp_path):
+    stations, lines, transfer_minutes = load_metro_network(network_file(tmp_path))
+    assert stations == STATIONS
+    assert lines == METRO_LINES
+    assert transfer_minutes == TRANSFER_MINUTES
+
+
+def set_connection_time(station, to, minutes):
+    def change(network):
+        network["stations"][station]["connections"] = [
+            [other, minutes if other == to else time] for other, time in network["stations"][station]["connections"]
+        ]
+    return change
+
+
+@pytest.mark.parametrize("change, message", [
+    (lambda n: n["stations"]["station1"]["connections"].append(["station9", 3]), "unknown station"),
+    (lambda n: n["lines"]["1"]["stations"].append("station9"), "unknown station"),
+    (lambda n: n["lines"]["1"]["stations"].append("station6"), "not connected"),
+    (set_connection_time("station1", "station2", 0), "more than 0"),
+    (set_connection_time("station1", "station2", -2), "more than 0"),
+    (lambda n: n["lines"]["1"].update(headway=0), "headway"),
+    (lambda n: n["lines"]["1"].pop("headway"), "headway"),
+    (lambda n: n["lines"]["1"].update(first=25 * 60), "first and last"),
+    (lambda n: n.update(transfer_minutes=-1), "transfer_minutes"),
+])
+def test_invalid_networks_are_rejected(tmp_path, change, message):
+    with pytest.raises((ValueError, KeyError), match=message):
+        load_metro_network(network_file(tmp_path, change))
+
+
+def test_failed_refresh_leaves_the_pool_unchanged():
+    pool = ChallengePool(seed=0)
+    pool.refresh(STATIONS, METRO_LINES)
+    before = (pool.version, pool.adjacency, pool.snapshot(), pool.optimum("station1", "station4").route)
+
+    broken = copy.deepcopy(STATIONS)
+    broken["station2"]["connections"].append(("station9", 1))  # no such station
+    with pytest.raises(KeyError):
+        pool.refresh(broken, METRO_LINES)
+    assert (pool.version, pool.adjacency, pool.snapshot(), pool.optimum("station1", "station4").route) == before
+
+
+def test_refresh_only_recomputes_affected_origins():
+    pool = ChallengePool(seed=0)
+    assert pool.refresh(STATIONS, METRO_LINES) == len(STATIONS)
+    assert pool.refresh(STATIONS, METRO_LINES) == 0
+    faster = copy.deepcopy(STATIONS)
+    for a, b in (("station5", "station6"), ("station6", "station5")):
+        faster[a]["connections"] = [(to, 1 if to == b else time) for to, time in faster[a]["connections"]]
+    assert 0 < pool.refresh(faster, METRO_LINES) <= len(STATIONS)
+    fresh = ChallengePool(seed=0)
+    fresh.refresh(faster, METRO_LINES)
+    for origin in faster:
+        for destination in faster:
+            assert pool.distance(origin, destination) == fresh.distance(origin, destination)
+    assert pool.distance("station5", "station4") == 4
+
+
+def test_alternatives_cache_is_bounded_lru():
+    pool = ChallengePool(seed=0, max_alternatives=2)
+    pool.refresh(STATIONS, METRO_LINES)
+    first = pool.alternatives("station1", "station4", 3)
+    pool.alternatives("station2", "station6", 3)
+    # Using station1 -> station4 again makes station2 -> station6 the oldest
+    assert pool.alternatives("station1", "station4", 3) is first
+    pool.alternatives("station3", "station5", 3)
+    assert pool.snapshot()["cached_alternatives"] == 2
+    assert pool.alternatives("station1", "station4", 3) is first
+    assert ("station2", "station6", 3) not in pool._alternatives
@@ -0,0 +1,31 @@
+from game_data import METRO_LINES, STATIONS, TRANSFER_MINUTES
+from metro_timetable import Timetable
+
+timetable = Timetable(STATIONS, METRO_LINES, TRANSFER_MINUTES)
+
+
+def test_daytime_journey():
+    journey = timetable.journey("station1", "station4", 8 * 60)
+    assert journey["departure"] >= 8 * 60
+    assert journey["duration"] == journey["arrival"] - 8 * 60
+    assert journey["legs"][0]["from"] == "station1"
+    assert journey["legs"][-1]["to"] == "station4"
+
+
+def test_departure_after_midnight_uses_late_service():
+    # Lines run until 00:40, stored as minutes 1440..1480 of the previous day
+    journey = timetable.journey("station1", "station4", 10)
+    assert journey["departure"] >= 24 * 60 + 10
+    assert journey["arrival"] < 24 * 60 + 60
+    assert journey["duration"] == journey["arrival"] - (24 * 60 + 10)
+    assert journey["duration"] < 60
+
+
+def test_departure_after_last_train_waits_for_first_train():
+    journey = timetable.journey("station1", "station4", 2 * 60)
+    assert journey["departure"] >= 5 * 60 + 30
+    assert journey["duration"] == journey["arrival"] - 2 * 60
+
+
+def test_same_station_has_no_journey():
+    assert timetable.journey("station1", "station1", 8 * 60) is None
@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache
+
+
+class FakeClock:
+    """Stands in for the `time` module inside response_cache only; the event loop keeps the real clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return time.perf_counter()
+
+
+def counting_handler(cache, namespace="items", ttl=30, release=None):
+    calls = []
+
+    @cache.cached(namespace, ttl=ttl)
+    async def handler(item: int = 0):
+        calls.append(item)
+        if release is not None:
+            await release.wait()
+        return {"item": item, "call": len(calls)}
+
+    return handler, calls
+
+
+def test_concurrent_misses_share_one_computation():
+    async def scenario():
+        cache = ResponseCache()
+        release = asyncio.Event()
+        handler, calls = counting_handler(cache, release=release)
+        tasks = [asyncio.ensure_future(handler(item=1)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+        assert calls == [1]
+        assert all(result == {"item": 1, "call": 1} for result in results)
+        stats = cache.snapshot()["namespaces"]["items"]
+        assert (stats["misses"], stats["coalesced"]) == (1, 4)
+
+        # Later calls are hits; other arguments are separate entries
+        assert await handler(item=1) == {"item": 1, "call": 1}
+        assert await handler(item=2) == {"item": 2, "call": 2}
+        assert calls == [1, 2]
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_during_computation_is_not_stored():
+    async def scenario():
+        cache = ResponseCache()
+        release = asyncio.Event()
+        handler, calls = counting_handler(cache, release=release)
+        first = asyncio.ensure_future(handler(item=1))
+        waiter = asyncio.ensure_future(handler(item=1))
+        await asyncio.sleep(0)
+        cache.invalidate("items")
+        release.set()
+        # Callers already waiting still get the result they waited for
+        assert await first == await waiter == {"item": 1, "call": 1}
+        assert cache.snapshot()["entries"] == 0
+
+        assert await handler(item=1) == {"item": 1, "call": 2}
+        assert calls == [1, 1]
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_by_arguments_only_drops_that_entry():
+    async def scenario():
+        cache = ResponseCache()
+        handler, calls = counting_handler(cache)
+        await handler(item=1)
+        await handler(item=2)
+        cache.invalidate("items", item=1)
+        await handler(item=1)
+        await handler(item=2)
+        assert calls == [1, 2, 1]
+
+    asyncio.run(scenario())
+
+
+def test_exception_reaches_every_waiting_caller():
+    async def scenario():
+        cache = ResponseCache()
+        release = asyncio.Event()
+        calls = []
+
+        @cache.cached("failing", ttl=30)
+        async def handler():
+            calls.append(1)
+            await release.wait()
+            raise RuntimeError("database down")
+
+        tasks = [asyncio.ensure_future(handler()) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert len(calls) == 1
+        assert all(isinstance(result, RuntimeError) and str(result) == "database down" for result in results)
+
+        # Failures are not cached
+        with pytest.raises(RuntimeError):
+            await handler()
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(response_cache, "time", clock)
+
+    async def scenario():
+        cache = ResponseCache()
+        handler, calls = counting_handler(cache, ttl=30)
+        await handler(item=1)
+        clock.now += 29
+        await handler(item=1)
+        assert calls == [1]
+        clock.now += 2
+        assert await handler(item=1) == {"item": 1, "call": 2}
+        assert calls == [1, 1]
+
+    asyncio.run(scenario())
+
+
+def test_oldest_entries_are_evicted_past_max_entries():
+    async def scenario():
+        cache = ResponseCache(max_entries=2)
+        handler, calls = counting_handler(cache)
+        for item in (1, 2, 1, 3):
+            await handler(item=item)
+        # 2 was the least recently used when 3 arrived
+        await handler(item=1)
+        await handler(item=2)
+        assert calls == [1, 2, 3, 2]
+
+    asyncio.run(scenario())
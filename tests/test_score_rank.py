@@ -0,0 +1,123 @@
+import random
+import tracemalloc
+import uuid
+
+from score_rank import FenwickTree, GameRanking, RankIndex
+from score_store import encode_game_type, encode_uuid
+
+
+def ranking_of(scores, **kwargs):
+    ranking = GameRanking(**kwargs)
+    for user_id, score in scores.items():
+        ranking.update(user_id, score)
+    return ranking
+
+
+def test_fenwick_prefix_and_select():
+    tree = FenwickTree(16)
+    counts = [0, 2, 0, 1, 0, 0, 3, 0, 0, 0, 0, 0, 0, 0, 0, 1]
+    for bucket, count in enumerate(counts):
+        if count:
+            tree.add(bucket, count)
+    for bucket in range(16):
+        assert tree.prefix(bucket) == sum(counts[:bucket + 1])
+    for k in range(1, sum(counts) + 1):
+        bucket = tree.select(k)
+        assert tree.prefix(bucket) >= k and (bucket == 0 or tree.prefix(bucket - 1) < k)
+
+
+def test_rank_and_percentile():
+    ranking = ranking_of({"a": 100, "b": 300, "c": 200, "d": 50})
+    assert ranking.rank("b") == {"rank": 1, "total": 4, "best": 300, "percentile": 100.0}
+    assert ranking.rank("c")["rank"] == 2
+    assert ranking.rank("d") == {"rank": 4, "total": 4, "best": 50, "percentile": 0.0}
+    assert ranking.rank("nobody") is None
+
+
+def test_only_the_best_score_counts():
+    ranking = ranking_of({"a": 100, "b": 200})
+    assert ranking.update("a", 50) is False
+    assert ranking.rank("a")["best"] == 100
+    assert ranking.update("a", 250) is True
+    assert ranking.rank("a")["rank"] == 1
+    assert ranking.total == 2
+
+
+def test_ties_share_a_rank_and_list_the_first_to_reach_it_first():
+    ranking = ranking_of({"a": 100, "b": 200, "c": 200, "d": 50})
+    assert ranking.rank("b")["rank"] == ranking.rank("c")["rank"] == 1
+    assert ranking.rank("a")["rank"] == 3
+    assert [user_id for user_id, _, _ in ranking.around("a", 3)] == ["b", "c", "a", "d"]
+    assert [rank for _, _, rank in ranking.around("a", 3)] == [1, 1, 3, 4]
+
+
+def test_around_is_clipped_to_the_ranking():
+    ranking = ranking_of({f"p{i}": i * 10 for i in range(10)})
+    assert [user_id for user_id, _, _ in ranking.around("p5", 2)] == ["p7", "p6", "p5", "p4", "p3"]
+    assert [user_id for user_id, _, _ in ranking.around("p9", 2)] == ["p9", "p8", "p7"]
+    assert [user_id for user_id, _, _ in ranking.around("p0", 2)] == ["p2", "p1", "p0"]
+    assert ranking.around("nobody", 2) == []
+
+
+def test_negative_scores_share_the_lowest_bucket():
+    ranking = ranking_of({"a": -30, "b": -5, "c": 0, "d": 10})
+    assert ranking.rank("d")["rank"] == 1
+    assert ranking.rank("a")["rank"] == ranking.rank("b")["rank"] == ranking.rank("c")["rank"] == 2
+    assert ranking.rank("a")["best"] == -30
+
+
+def test_tree_grows_for_higher_scores():
+    ranking = ranking_of({"a": 10, "b": 5000}, initial_size=16)
+    assert ranking.tree.size > 5000
+    assert ranking.rank("b")["rank"] == 1
+    assert ranking.rank("a")["rank"] == 2
+    assert ranking.at_position(0) == ("b", 5000, 1)
+
+
+def test_scores_past_the_cap_share_the_top_bucket():
+    ranking = ranking_of({"a": 900, "b": 2_000_000_000, "c": 5000}, initial_size=16, max_buckets=1024)
+    assert ranking.tree.size == 1024
+    assert ranking.rank("b")["best"] == 2_000_000_000
+    assert ranking.rank("b")["rank"] == ranking.rank("c")["rank"] == 1
+    assert ranking.rank("a")["rank"] == 3
+
+
+def test_huge_score_does_not_allocate_in_proportion():
+    tracemalloc.start()
+    try:
+        ranking = ranking_of({"a": 1, "b": 10 ** 7, "c": 2_000_000_000})
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 5 * 1024 * 1024
+    assert ranking.rank("c")["rank"] == 1
+
+
+def test_matches_sorting_on_random_scores():
+    rng = random.Random(0)
+    ranking = GameRanking(initial_size=8)
+    best = {}
+    for _ in range(2000):
+        user_id = f"p{rng.randrange(300)}"
+        score = rng.randrange(-50, 3000)
+        ranking.update(user_id, score)
+        best[user_id] = max(best.get(user_id, score), score)
+    bucket = lambda score: max(0, score)
+    for user_id, score in best.items():
+        higher = sum(1 for other in best.values() if bucket(other) > bucket(score))
+        assert ranking.rank(user_id)["rank"] == higher + 1
+    ordered = [ranking.at_position(p)[1] for p in range(ranking.total)]
+    assert [bucket(score) for score in ordered] == sorted((bucket(s) for s in best.values()), reverse=True)
+
+
+def test_index_loads_bests_of_both_layouts():
+    user_id = str(uuid.uuid4())
+    index = RankIndex()
+    rows = [
+        {"_id": {"user_id": encode_uuid(user_id), "game_type": encode_game_type("paris_metro")}, "best": 70},
+        {"_id": {"user_id": user_id, "game_type": "paris_metro"}, "best": 90},
+        {"_id": {"user_id": "someone", "game_type": "whac_a_deficiency"}, "best": 400},
+    ]
+    assert index.load(rows) == 3
+    assert index.game("paris_metro").rank(user_id) == {"rank": 1, "total": 1, "best": 90, "percentile": 100.0}
+    assert index.snapshot()["games"]["whac_a_deficiency"]["players"] == 1
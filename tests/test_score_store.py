@@ -0,0 +1,115 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from bson.binary import Binary
+
+from score_store import (
+    GAME_TYPE_CODES, decode_game_type, decode_score, decode_uuid, encode_game_type, encode_score, encode_uuid,
+    game_type_filter, score_id_for_key, summary_id, user_id_filter,
+)
+
+USER_ID = str(uuid.uuid4())
+CREATED_AT = datetime(2024, 5, 1, 12, 30)
+
+
+def legacy_document(**fields):
+    document = {
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "user_id": USER_ID,
+        "game_type": "paris_metro",
+        "score": 80,
+        "time_taken": 42.5,
+        "created_at": CREATED_AT,
+    }
+    document.update(fields)
+    return document
+
+
+def test_uuid_round_trip():
+    encoded = encode_uuid(USER_ID)
+    assert isinstance(encoded, Binary) and len(encoded) == 16
+    assert decode_uuid(encoded) == USER_ID
+
+
+def test_non_uuid_values_are_kept():
+    assert encode_uuid("not-a-uuid") == "not-a-uuid"
+    assert encode_uuid(None) is None
+    assert decode_uuid("not-a-uuid") == "not-a-uuid"
+
+
+def test_game_type_round_trip():
+    for name, code in GAME_TYPE_CODES.items():
+        assert encode_game_type(name) == code
+        assert decode_game_type(code) == name
+    assert encode_game_type("new_game") == "new_game"
+    assert decode_game_type("new_game") == "new_game"
+
+
+def test_compact_score_round_trip():
+    fields = {key: value for key, value in legacy_document().items() if key != "_id"}
+    document = encode_score(fields)
+    assert "id" not in document
+    assert document["game_type"] == GAME_TYPE_CODES["paris_metro"]
+    assert decode_score(document) == fields
+
+
+def test_legacy_document_decodes_to_the_same_fields():
+    legacy = legacy_document()
+    assert decode_score(legacy) == decode_score(encode_score(legacy))
+
+
+def test_missing_time_taken_is_not_stored():
+    document = encode_score(legacy_document(time_taken=None))
+    assert "time_taken" not in document
+    assert decode_score(document)["time_taken"] is None
+
+
+def test_summary_id_is_the_same_for_both_layouts():
+    legacy = legacy_document()
+    compact = encode_score(legacy)
+    assert summary_id(legacy["user_id"], legacy["game_type"]) == summary_id(compact["user_id"], compact["game_type"])
+
+
+def test_score_id_for_key_is_stable_per_user():
+    assert score_id_for_key(USER_ID, "k1") == score_id_for_key(USER_ID, "k1")
+    assert score_id_for_key(USER_ID, "k1") != score_id_for_key(USER_ID, "k2")
+    assert score_id_for_key(USER_ID, "k1") != score_id_for_key(str(uuid.uuid4()), "k1")
+
+
+@pytest.fixture
+def scores():
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient().db.scores
+
+
+def test_filters_match_both_layouts(scores):
+    legacy = legacy_document()
+    compact = encode_score(legacy_document())
+    other = encode_score(legacy_document(user_id=str(uuid.uuid4()), game_type="whac_a_deficiency"))
+    scores.insert_many([legacy, compact, other])
+
+    by_user = scores.find({"user_id": user_id_filter(USER_ID)})
+    assert sorted(decode_score(document)["id"] for document in by_user) == sorted(
+        [legacy["id"], decode_uuid(compact["_id"])])
+    by_game = scores.find({"game_type": game_type_filter("paris_metro")})
+    assert len(list(by_game)) == 2
+    assert scores.count_documents({"game_type": game_type_filter("whac_a_deficiency")}) == 1
+
+
+def test_migration_resumes_after_the_last_migrated_document(scores):
+    from migrate_scores import LEGACY_FILTER, migrate
+
+    db = scores.database
+    legacy = [legacy_document(score=i) for i in range(7)]
+    compact = encode_score(legacy_document(score=100))
+    scores.insert_many(legacy + [compact])
+
+    assert migrate(db, batch_size=2, pause=0, limit=3) == 3
+    assert db.migrations.find_one({"_id": "compact_scores"})["position"] == legacy[2]["_id"]
+    assert migrate(db, batch_size=2, pause=0) == 4
+    assert scores.count_documents(LEGACY_FILTER) == 0
+    assert sorted(document["score"] for document in scores.find()) == list(range(7)) + [100]
+    assert scores.find_one({"_id": encode_uuid(legacy[0]["id"])})["user_id"] == encode_uuid(USER_ID)